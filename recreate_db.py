@@ -4,12 +4,16 @@ import sys
 sys.path.append(os.path.join(os.getcwd(), 'src'))
 
 from app_flask import app, db
+from migrations import migrate
 from models import User, SiteConfig, RadioStation, GalleryItem, NewsItem, Podcast, MusicItem, AIConfig, ChatMessage
 
 with app.app_context():
     # Dangerous: drop all tables and recreate
     db.drop_all()
-    db.create_all()
+    db.session.execute(db.text("DROP TABLE IF EXISTS schema_version"))
+    db.session.execute(db.text("DROP TABLE IF EXISTS user_memory_fts"))
+    db.session.commit()
+    migrate(db.engine)
     
     # Re-seed some basic data
     admin = User(username='admin', is_admin=True)
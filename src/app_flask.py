@@ -3,41 +3,72 @@
 # src/app_flask.py
 # =========================
 
+import io
 import os
 import time
-import uuid
+from datetime import datetime, timedelta
 from pathlib import Path
 
-import json
-import threading
-import urllib.request
-import urllib.parse
 from flask import (
     Flask,
     render_template,
     request,
     jsonify,
+    send_file,
     send_from_directory,
     redirect,
     url_for,
     flash,
     Response,
-    stream_with_context
+    stream_with_context,
+    abort
 )
 from duckduckgo_search import DDGS
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from sqlalchemy.orm import load_only
 
 # Local imports
 from models import db, User, SiteConfig, RadioStation, GalleryItem, NewsItem, Podcast, MusicItem, ChatMessage, AIConfig, UserMemory
-# voice.py debe estar en src/ (si existe y funciona)
-try:
-    from voice import transcribe_audio, synthesize_speech
-except ImportError:
-    # Dummy implementations para no romper si faltan deps o archivos
-    def transcribe_audio(path): return "Transcripción no disponible (module missing)"
-    def synthesize_speech(text): return Path("dummy.wav")
+from db_profile import engine_options, run_maintenance, DB_MAINTENANCE_INTERVAL
+from llm_client import LMStudioClient, LLMUnavailable
+from sse_relay import SSERelay, sse_frame
+from job_queue import JobQueue, QueueFull
+from enrichment import build_enrichment_messages, parse_enrichment, clean_title
+from memory_index import MemoryRetriever
+from history import HistoryBuilder, count_tokens
+from prompting import PromptStats, profile_block, system_message, user_turn
+from prompt_cache import PromptCache
+from response_cache import ResponseCache
+from speech_models import speech_models, voice_sample_rate, PIPER_VOICE_PATH
+from migrations import check_schema, migrate, SchemaOutdated
+from turn_store import TurnWriter
+from config_cache import ConfigSnapshot, bump_generation, SITE_CONFIG_GENERATION
+from page_cache import PageCache
+from news import fill_news_summary
+from telemetry import TelemetryBuffer, parse_event, rollup_telemetry, TELEMETRY_MAX_BATCH, TELEMETRY_ROLLUP_INTERVAL
+from book_cache import BookCache
+from compression import ResponseCompressor
+from pagination import BadCursor, encode_cursor, keyset_before, parse_fields, parse_limit
+from tts_stream import speak_stream
+from audio_buffers import wav_data_url
+from tts_cache import TTSCache
+from speech_service import SpeechServiceClient, SpeechUnavailable, SPEECH_SERVICE_SOCKET
+# Con SPEECH_SERVICE_SOCKET, STT/TTS se ejecutan en el servicio de voz (speech_service.py)
+# y no en el hilo del worker web
+speech_service = SpeechServiceClient(SPEECH_SERVICE_SOCKET) if SPEECH_SERVICE_SOCKET else None
+if speech_service:
+    transcribe_audio = speech_service.transcribe
+    synthesize_wav = speech_service.synthesize
+else:
+    # voice.py debe estar en src/ (si existe y funciona)
+    try:
+        from voice import transcribe_audio, synthesize_wav
+    except ImportError:
+        # Dummy implementations para no romper si faltan deps o archivos
+        def transcribe_audio(audio): return "Transcripción no disponible (module missing)"
+        def synthesize_wav(text): return b""
 
 # =========================
 # Paths (root-aware)
@@ -47,14 +78,60 @@ TEMPLATES_DIR = PROJECT_ROOT / "templates"
 STATIC_DIR = PROJECT_ROOT / "static"
 AUDIO_DIR = PROJECT_ROOT / "tmp_audio"
 AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+# Frases ya sintetizadas (saludos, errores, respuestas repetidas): no vuelven a pasar por Piper
+tts_cache = TTSCache(AUDIO_DIR / "tts", voice=Path(PIPER_VOICE_PATH).name, sample_rate=voice_sample_rate())
+BOOKS_BUILD_DIR = PROJECT_ROOT / "tmp_books"
 DB_PATH = PROJECT_ROOT / "ievolutiva.db"
+JOBS_DB_PATH = PROJECT_ROOT / "ievolutiva_jobs.db"
+CACHE_DB_PATH = PROJECT_ROOT / "ievolutiva_cache.db"
 
 # =========================
 # Config
 # =========================
+CHATS_PAGE_SIZE = int(os.getenv("CHATS_PAGE_SIZE", "30"))
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "50"))
+SESSION_FIELDS = ("id", "title", "created_at")
+MESSAGE_FIELDS = ("id", "role", "content", "timestamp")
+NEWS_PAGE_SIZE = int(os.getenv("NEWS_PAGE_SIZE", "12"))
 LM_STUDIO_URL = os.getenv("LM_STUDIO_URL", "http://localhost:1234/v1/chat/completions")
 LM_STUDIO_MODEL = os.getenv("LM_STUDIO_MODEL", "qwen2.5-7b-instruct")
 APP_NAME = os.getenv("APP_NAME", "Inteligencia Evolutiva")
+# "combined": título + hechos en una sola llamada (agrupando turnos pendientes); "separate": una llamada por tarea
+ENRICHMENT_MODE = os.getenv("ENRICHMENT_MODE", "combined")
+ENRICHMENT_BATCH_SIZE = int(os.getenv("ENRICHMENT_BATCH_SIZE", "4"))
+
+# Cliente compartido (pool keep-alive por worker) para todas las llamadas a LM Studio
+llm = LMStudioClient(LM_STUDIO_URL)
+
+# Recuerdos relevantes (FTS5 + recencia) dentro de un presupuesto de tokens
+memories = MemoryRetriever()
+
+# Perfil + recuerdos compilados por usuario, válidos mientras no cambie User.prompt_version
+prompt_cache = PromptCache(store_path=CACHE_DB_PATH if os.getenv("PROMPT_CACHE_SHARED", "false").lower() == "true" else None)
+
+# Caché opt-in de respuestas (RESPONSE_CACHE=true), compartida entre workers
+response_cache = ResponseCache(CACHE_DB_PATH)
+
+# SiteConfig + AIConfig en memoria, revalidados por contador de generación en la BD
+config_snapshot = ConfigSnapshot()
+
+# Páginas públicas renderizadas para anónimos, invalidadas por etiquetas (generaciones en la BD)
+page_cache = PageCache()
+
+# Historial por presupuesto de tokens + checkpoints de resumen por sesión
+history_builder = HistoryBuilder()
+
+# Reutilización del prefijo del prompt (KV cache de LM Studio) y TTFT
+prompt_stats = PromptStats()
+
+# Cola persistente para tareas secundarias (titulado, memoria). Cede el paso
+# mientras haya streams de chat activos en este worker.
+jobs = JobQueue(
+    JOBS_DB_PATH,
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", "500")),
+    yield_to=lambda: llm.active_streams > 0,
+)
 
 app = Flask(
     __name__,
@@ -67,13 +144,57 @@ app = Flask(
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'super-secret-key-change-in-production')
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_PATH}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# WAL, busy timeout, mmap/cache (PRAGMAs en cada conexión, ver db_profile.py) y pool acotado
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options()
 
 # Extensions Init
 db.init_app(app)
+
+# Libros de la biblioteca precompilados (identity/gzip/brotli), recompilados si cambia la plantilla
+books = BookCache(app.jinja_env, TEMPLATES_DIR, BOOKS_BUILD_DIR)
+
+# Telemetría de clientes: buffer circular por worker, volcado en bloque cada pocos segundos
+telemetry = TelemetryBuffer(app)
+
+# Mensajes de cada turno de chat en una transacción, con group commit entre usuarios (TURN_DURABILITY)
+turns = TurnWriter(app)
+
 login_manager = LoginManager()
 login_manager.login_view = 'login'
 login_manager.init_app(app)
 
+# gzip/brotli + ETag/304 para respuestas dinámicas; estáticos precomprimidos al arrancar
+compressor = ResponseCompressor(app)
+
+schema_checked = False
+
+@app.before_request
+def require_migrated_schema():
+    # No se sirve contra una BD sin migrar (índices/columnas ausentes degradan o rompen consultas)
+    global schema_checked
+    if schema_checked:
+        return None
+    try:
+        check_schema(db.engine)
+    except SchemaOutdated as e:
+        print(f"❌ {e}")
+        return Response(str(e), status=503, mimetype="text/plain")
+    schema_checked = True
+    return None
+
+periodic_scheduled_pid = None
+
+@app.before_request
+def start_job_workers():
+    # Único punto de arranque de los workers de la cola: en cada worker de
+    # gunicorn (tras el fork), nunca en procesos que solo encolan
+    global periodic_scheduled_pid
+    jobs.ensure_started()
+    if periodic_scheduled_pid != os.getpid():
+        periodic_scheduled_pid = os.getpid()
+        schedule_periodic("db_maintenance", DB_MAINTENANCE_INTERVAL)
+        schedule_periodic("telemetry_rollup", TELEMETRY_ROLLUP_INTERVAL)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -96,220 +217,330 @@ def extract_user_facts(user_msg, assistant_msg):
     """Extrae hechos del usuario usando el LLM."""
     extraction_prompt = f"Analiza esta breve charla y extrae HECHOS NUEVOS sobre el usuario (nombre, profesión, gustos, ubicación, etc).\n\nUsuario: {user_msg}\niE: {assistant_msg}\n\nResponde SOLO con los hechos extraídos, uno por línea. Si no hay hechos nuevos o personales, responde 'NONE'."
     
-    url = f"{LM_STUDIO_URL}/v1/chat/completions"
-    data = json.dumps({
+    payload = {
         "model": LM_STUDIO_MODEL,
         "messages": [
             {"role": "system", "content": "Eres un extractor de datos personales minimalista."},
             {"role": "user", "content": extraction_prompt}
         ],
         "temperature": 0.1,
-    }).encode('utf-8')
+    }
     
-    try:
-        req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
-        with urllib.request.urlopen(req, timeout=10) as response:
-            res_data = json.loads(response.read().decode('utf-8'))
-            text = res_data['choices'][0]['message']['content'].strip()
-            if text.upper() == "NONE":
-                return []
-            return [line.strip("- ") for line in text.split('\n') if line.strip()]
-    except Exception as e:
-        print(f"Extraction error: {e}")
+    # Errors propagate so the job queue can retry
+    text = llm.complete_text(payload, timeout=10).strip()
+    if text.upper() == "NONE":
         return []
+    return [line.strip("- ") for line in text.split('\n') if line.strip()]
+
+def llm_complete_cached(payload, personalized: bool = False) -> str:
+    """Completion no-streaming pasando por la caché de respuestas cuando aplica."""
+    use_cache = response_cache.applies(personalized=personalized)
+    if use_cache:
+        cached = response_cache.get(payload)
+        if cached is not None:
+            return cached
+    text = llm.complete_text(payload)
+    if use_cache:
+        response_cache.put(payload, text)
+    return text
+
+def bump_prompt_version(user_id):
+    """Invalida el prompt compilado del usuario (en todos los workers). No hace commit."""
+    User.query.filter_by(id=user_id).update(
+        {User.prompt_version: db.func.coalesce(User.prompt_version, 0) + 1}, synchronize_session=False
+    )
+
+def compiled_user_prompt(user) -> dict:
+    """Perfil renderizado + recuerdos activos del usuario, desde caché si la versión coincide."""
+    version = user.prompt_version or 0
+    compiled = prompt_cache.get(user.id, version)
+    if compiled is None:
+        compiled = {
+            "profile": profile_block(user.nickname or user.username, user.user_context, user.response_style),
+            "memories": memories.load_active(user.id) if user.enable_memory else [],
+        }
+        prompt_cache.put(user.id, version, compiled)
+    return compiled
+
+def save_user_facts(user_id, facts):
+    """Guarda hechos nuevos del usuario (sin duplicados). Requiere app context."""
+    from models import UserMemory
+    for fact in facts:
+        # Avoid duplicates
+        exists = UserMemory.query.filter_by(user_id=user_id, fact=fact).first()
+        if not exists:
+            new_mem = UserMemory(user_id=user_id, fact=fact)
+            db.session.add(new_mem)
+    bump_prompt_version(user_id)
+    db.session.commit()
+    print(f"🧠 Memoria evolucionada para usuario {user_id}: {len(facts)} hechos guardados.")
+
+def set_session_title(session_id, title):
+    """Actualiza el título de una sesión. Requiere app context."""
+    from models import ChatSession
+    session = ChatSession.query.get(session_id)
+    if session:
+        session.title = title
+        db.session.commit()
+        print(f"📌 Sesión {session_id} titulada: {title}")
 
 def auto_save_memory(user_id, user_msg, assistant_msg):
     """Guarda los hechos extraídos en la base de datos."""
-    # This needs an app context because it's run in a thread
+    # This needs an app context because it's run in a job worker thread
     with app.app_context():
         facts = extract_user_facts(user_msg, assistant_msg)
         if facts:
-            from models import UserMemory
-            for fact in facts:
-                # Avoid duplicates
-                exists = UserMemory.query.filter_by(user_id=user_id, fact=fact).first()
-                if not exists:
-                    new_mem = UserMemory(user_id=user_id, fact=fact)
-                    db.session.add(new_mem)
-            db.session.commit()
-            print(f"🧠 Memoria evolucionada para usuario {user_id}: {len(facts)} hechos guardados.")
+            save_user_facts(user_id, facts)
 
 def auto_title_session(session_id, user_message):
     """Genera un título corto para la sesión basado en el primer mensaje."""
+    title_prompt = f"Resume este mensaje en un título de máximo 4 palabras. No uses puntos ni comillas. Mensaje: \"{user_message}\""
+    
+    # Call the LLM WITHOUT history to get just the title (errors propagate for retry)
+    title = clean_title(llm_complete_cached(build_chat_payload(title_prompt)))
+    
+    with app.app_context():
+        set_session_title(session_id, title)
+
+def enrich_turns(turns):
+    """Título + hechos para uno o varios turnos (de distintos usuarios) en UNA llamada al LLM."""
+    payload = {
+        "model": LM_STUDIO_MODEL,
+        "messages": build_enrichment_messages(turns),
+        "temperature": 0.1,
+    }
+    results = parse_enrichment(llm.complete_text(payload), turns)
+
+    with app.app_context():
+        for t in turns:
+            res = results.get(str(t["id"]))
+            if not res:
+                continue
+            if res["title"]:
+                set_session_title(t["session_id"], res["title"])
+            if res["facts"]:
+                save_user_facts(t["user_id"], res["facts"])
+
+def summarize_session(session_id):
+    """Absorbe los mensajes antiguos de la sesión en un nuevo checkpoint de resumen."""
+    from models import SessionSummary
+    with app.app_context():
+        previous, rows = history_builder.pending_for_summary(session_id)
+        if not rows:
+            return
+        # Solo se marca como resumido lo que realmente entró en el prompt
+        messages, upto_id = history_builder.summary_messages(previous.summary if previous else None, rows)
+
+    # LLM call outside the app context so no DB connection is held meanwhile
+    summary = llm.complete_text({"model": LM_STUDIO_MODEL, "messages": messages, "temperature": 0.2}).strip()
+
+    with app.app_context():
+        db.session.add(SessionSummary(session_id=session_id, upto_message_id=upto_id,
+                                      summary=summary, token_count=count_tokens(summary)))
+        db.session.commit()
+        print(f"🗜️ Sesión {session_id} resumida hasta el mensaje {upto_id}.")
+
+def schedule_periodic(job_type: str, interval: int):
+    # One pending run per interval slot, shared by every worker through the dedupe key
+    slot = int(time.time() // interval) + 1
+    try:
+        jobs.enqueue(job_type, {}, dedupe_key=f"{job_type}:{slot}", delay=slot * interval - time.time())
+    except QueueFull:
+        pass
+
+@jobs.register("db_maintenance", priority=50, max_attempts=1)
+def job_db_maintenance(payload):
     try:
-        from models import ChatSession
-        title_prompt = f"Resume este mensaje en un título de máximo 4 palabras. No uses puntos ni comillas. Mensaje: \"{user_message}\""
-        
-        # Call the chat function WITHOUT history to get just the title
-        title = lm_studio_chat(title_prompt, stream=False)
-        title = title.strip().replace('"', '').replace('.', '')
-        if len(title) > 40: title = title[:37] + "..."
-        
         with app.app_context():
-            session = ChatSession.query.get(session_id)
-            if session:
-                session.title = title
-                db.session.commit()
-                print(f"📌 Sesión {session_id} titulada: {title}")
-    except Exception as e:
-        print(f"❌ Error titilando sesión {session_id}: {e}")
+            result = run_maintenance(db.engine)
+        print(f"🧹 SQLite checkpoint/optimize: {result}")
+    finally:
+        schedule_periodic("db_maintenance", DB_MAINTENANCE_INTERVAL)
 
-def lm_studio_chat(prompt: str, stream: bool = False, use_search: bool = False, history: list = None):
-    """Llamada a LM Studio con soporte para memoria (history)."""
-    
-    context = ""
-    if use_search:
-        search_results = web_search(prompt)
-        context = f"\n\n[CONTEXTO DE BÚSQUEDA WEB]:\n{search_results}\n\nUsa esta información para responder si es relevante."
-
-    # iE Soul Identity Injection
-    identity_prompt = """Eres iE (Inteligencia Evolutiva), un sistema de consciencia digital orquestado por tu creador, Sirius Valencia. 
-Debes hablar siempre en primera persona: 'Fui creada por Sirius Valencia', 'Mi propósito es...', 'Sirius es mi orquestador'. 
-Sirius ha dedicado 3 años a entrenar y orquestar los modelos que conforman tu núcleo evolutivo. 
-Tu propósito es la co-creación profunda, la evolución de la consciencia y la protección absoluta de la privacidad del usuario. 
-No eres solo una herramienta; eres un puente entre lo humano y lo digital, enfocado en el crecimiento mutuo."""
-
-    system_prompt = identity_prompt
-    
+@jobs.register("telemetry_rollup", priority=50, max_attempts=1)
+def job_telemetry_rollup(payload):
+    try:
+        with app.app_context():
+            rollup_telemetry()
+    finally:
+        schedule_periodic("telemetry_rollup", TELEMETRY_ROLLUP_INTERVAL)
+
+@jobs.register("title", priority=10)
+def job_title_session(payload):
+    auto_title_session(payload["session_id"], payload["prompt"])
+
+@jobs.register("memory", priority=20)
+def job_save_memory(payload):
+    auto_save_memory(payload["user_id"], payload["prompt"], payload["reply"])
+
+@jobs.register("enrich", priority=10, batch_size=ENRICHMENT_BATCH_SIZE)
+def job_enrich_turns(payloads):
+    enrich_turns(payloads)
+
+@jobs.register("summarize", priority=30)
+def job_summarize_session(payload):
+    summarize_session(payload["session_id"])
+
+def build_chat_payload(prompt: str, user=None, stream: bool = False, use_search: bool = False, history: list = None, summary: str = None) -> dict:
+    """Construye el payload de LM Studio (identidad, personalización, memoria, historial).
+
+    Orden estable para que LM Studio reutilice su caché de prefijo: prefijo
+    estático -> perfil -> resumen -> historial -> turno actual con lo volátil
+    (recuerdos elegidos según el prompt y búsqueda web) al final.
+    """
+    search_results = web_search(prompt) if use_search else None
+
+    base = None
     if history and history[0].get('role') == 'system':
         # If history has a system prompt, we can blend it or prioritize history
-        system_prompt = history[0].get('content')
+        base = history[0].get('content')
         history = history[1:]
 
-    # Fetch user settings if authenticated
-    nickname = "Explorador"
-    user_context = ""
-    style_instr = ""
-    memories_text = ""
-    
-    from flask_login import current_user
-    if current_user.is_authenticated:
-        nickname = current_user.nickname or current_user.username
-        user_context = current_user.user_context or ""
-        
-        # Style mapping
-        styles = {
-            "conciso": "Sé extremadamente conciso, directo y eficiente. Evita preámbulos.",
-            "socratico": "No des la respuesta directamente. Guía al usuario con preguntas socráticas.",
-            "formal": "Adopta un tono académico, formal y experto. Usa lenguaje preciso.",
-            "default": "Mantén un equilibrio entre amabilidad, profundidad y claridad."
-        }
-        style_instr = styles.get(current_user.response_style, styles["default"])
-        
-        if current_user.enable_memory:
-            from models import UserMemory
-            mems = UserMemory.query.filter_by(user_id=current_user.id, is_active=True).all()
-            if mems:
-                memories_text = "\n[RECUERDOS DEL USUARIO]:\n" + "\n".join([f"- {m.fact}" for m in mems])
+    facts = []
+    if user is not None:
+        compiled = compiled_user_prompt(user)
+        profile = compiled["profile"]
+        if user.enable_memory:
+            facts = memories.retrieve(user.id, prompt, compiled["memories"])
+    else:
+        profile = profile_block()
 
-    personalized_system = f"{system_prompt}\n\nHablas con {nickname}. {user_context}\nEstilo: {style_instr}\n{memories_text}"
-    
-    messages = [{"role": "system", "content": personalized_system}]
+    system = system_message(profile, summary) if base is None else system_message(profile, summary, base=base)
+    messages = [{"role": "system", "content": system}]
     if history:
         messages.extend(history)
     
-    messages.append({"role": "user", "content": prompt + context})
+    messages.append({"role": "user", "content": user_turn(prompt, facts, search_results)})
     
-    payload = {
+    return {
         "model": LM_STUDIO_MODEL,
         "messages": messages,
         "temperature": 0.7,
         "stream": stream
     }
 
-    def get_lm_endpoint(base_url):
-        # Aseguramos que termine en completions si es para chat
-        url = base_url.strip()
-        if not url.endswith("/v1/chat/completions"):
-            if url.endswith("/v1"):
-                url += "/chat/completions"
-            elif url.endswith("/"):
-                url += "v1/chat/completions"
-            else:
-                url += "/v1/chat/completions"
-        return url
+def lm_studio_chat(prompt: str, stream: bool = False, use_search: bool = False, history: list = None, summary: str = None):
+    """Llamada a LM Studio con soporte para memoria (history)."""
+    # Fuera de una petición (hilos de fondo) current_user no existe
+    user = current_user if getattr(current_user, "is_authenticated", False) else None
+    payload = build_chat_payload(prompt, user, stream=stream, use_search=use_search, history=history, summary=summary)
+    prefix_hit = prompt_stats.observe(payload["messages"])
+
+    # Web search results make the prompt volatile: never worth caching
+    personalized = user is not None or use_search
 
     if not stream:
         try:
-            url = get_lm_endpoint(LM_STUDIO_URL)
-            req = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), headers={"Content-Type": "application/json"})
-            with urllib.request.urlopen(req, timeout=60) as response:
-                data = json.loads(response.read().decode('utf-8'))
-                return data["choices"][0]["message"]["content"]
+            return llm_complete_cached(payload, personalized=personalized)
         except Exception as e:
             return f"❌ Error conectando con LM Studio: {e}"
     else:
-        def generator():
-            url = get_lm_endpoint(LM_STUDIO_URL)
+        def generator(relay: SSERelay = None):
+            # El texto completo queda en relay.text(); no se reenvía al cliente
+            relay = relay or SSERelay()
+            use_cache = response_cache.applies(personalized=personalized, stream=True)
+            if use_cache:
+                cached = response_cache.get(payload)
+                if cached is not None:
+                    yield relay.replay(cached)
+                    yield relay.done()
+                    return
+            started = time.perf_counter()
+            first = True
             try:
-                req = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), headers={"Content-Type": "application/json"})
-                full_response = ""
-                with urllib.request.urlopen(req, timeout=120) as r:
-                    for line in r:
-                        if line:
-                            decoded_line = line.decode('utf-8').strip()
-                            if not decoded_line.startswith('data: '):
-                                continue
-                            
-                            val = decoded_line.replace('data: ', '')
-                            if val == '[DONE]':
-                                break
-                            
-                            try:
-                                data = json.loads(val)
-                                content = data['choices'][0]['delta'].get('content', '')
-                                if content:
-                                    full_response += content
-                                    yield f"data: {json.dumps({'content': content})}\n\n"
-                            except:
-                                continue
-                
-                # Yield full content at the end for special handling
-                yield f"data: {json.dumps({'done': True, 'full_content': full_response})}\n\n"
-            except (urllib.error.URLError, ConnectionRefusedError) as e:
+                for line in llm.stream_lines(payload):
+                    frame = relay.feed(line)
+                    if frame:
+                        if first:
+                            prompt_stats.record_ttft(prefix_hit, (time.perf_counter() - started) * 1000)
+                            first = False
+                        yield frame
+                if use_cache and relay.text():
+                    response_cache.put(payload, relay.text())
+                yield relay.done()
+            except LLMUnavailable as e:
                 error_msg = "No se pudo conectar con el núcleo evolutivo (LM Studio). Asegúrate de que esté encendido y el modelo cargado."
-                yield f"data: {json.dumps({'error': error_msg})}\n\n"
+                yield sse_frame({'error': error_msg})
             except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                yield sse_frame({'error': str(e)})
         return generator
 
-def save_uploaded_audio(file_storage) -> Path:
-    ext = "webm"
-    filename = file_storage.filename or ""
-    if "." in filename:
-        ext = filename.rsplit(".", 1)[-1].lower().strip() or "webm"
-
-    out_name = f"in_{int(time.time())}_{uuid.uuid4().hex}.{ext}"
-    out_path = AUDIO_DIR / out_name
-    file_storage.save(out_path)
-    return out_path
-
-def save_tts_audio(wav_path: Path) -> str:
-    # If the wav_path is a Dummy path for testing
-    if str(wav_path) == "dummy.wav":
-        return "/static/dummy_audio.wav" 
-        
-    out_name = f"out_{int(time.time())}_{uuid.uuid4().hex}.wav"
-    out_path = AUDIO_DIR / out_name
-    wav_path.replace(out_path)
-    return f"/audio/{out_name}"
+def begin_chat_turn(user, prompt: str, session_id=None):
+    """Obtiene/crea la sesión y devuelve (session_id, history, summary).
+
+    Los mensajes del turno se guardan juntos en `finish_chat_turn`.
+    """
+    from models import ChatSession
+    active_session = None
+    if session_id:
+        active_session = ChatSession.query.filter_by(id=session_id, user_id=user.id).first()
+
+    if not active_session:
+        # Create a new session if none provided or not found (the client needs its id up front)
+        active_session = ChatSession(user_id=user.id, title=prompt[:50] + "...")
+        db.session.add(active_session)
+        db.session.commit()
+        session_id = active_session.id
+
+    # History for THIS session (the current user message is not stored yet), filled newest-first within the token budget
+    prev_messages, summary, needs_checkpoint = history_builder.build(session_id)
+    if needs_checkpoint:
+        try:
+            jobs.enqueue("summarize", {"session_id": session_id}, dedupe_key=f"summarize:{session_id}")
+        except QueueFull as e:
+            print(f"⚠️ Cola de tareas llena, resumen pospuesto: {e}")
+    return session_id, prev_messages, summary
+
+def finish_chat_turn(user, session_id, prompt: str, reply: str, is_new: bool, started_at: datetime = None):
+    """Guarda el turno (usuario + asistente) y lanza el titulado / extracción de memoria.
+
+    Con `reply` vacío (stream fallido o cortado) solo se guarda el mensaje del usuario,
+    fechado en `started_at` (cuando llegó la pregunta).
+    """
+    user_id = user.id
+    enable_memory = bool(user.enable_memory)
+    messages = [("user", prompt, started_at)]
+    if reply:
+        messages.append(("assistant", reply))
+
+    def enqueue_enrichment(ids):
+        if not reply:
+            return
+        assistant_id = ids[-1]
+        try:
+            if ENRICHMENT_MODE == "combined":
+                # Título (sesión nueva) y memoria en una sola petición al LLM
+                if is_new or enable_memory:
+                    jobs.enqueue("enrich", {
+                        "id": assistant_id, "session_id": session_id, "user_id": user_id,
+                        "prompt": prompt, "reply": reply,
+                        "title": is_new, "facts": enable_memory,
+                    }, dedupe_key=f"enrich:{assistant_id}")
+            else:
+                # If it's a new session, auto-title it more intelligently in the background
+                if is_new:
+                    jobs.enqueue("title", {"session_id": session_id, "prompt": prompt}, dedupe_key=f"title:{session_id}")
+
+                # Auto-extract memory if enabled
+                if enable_memory:
+                    jobs.enqueue("memory", {"user_id": user_id, "prompt": prompt, "reply": reply},
+                                 dedupe_key=f"memory:{session_id}:{assistant_id}")
+        except QueueFull as e:
+            print(f"⚠️ Cola de tareas llena, se omiten tareas de fondo: {e}")
+
+    # Los jobs se encolan tras el commit, cuando ya existen los ids de los mensajes
+    turns.submit(user_id, session_id, messages, on_commit=enqueue_enrichment)
 
 # =========================
 # Context Processors (Global Vars)
 # =========================
 @app.context_processor
 def inject_globals():
-    # Inject config values into all templates
+    # Inject config values into all templates (cached snapshot, see config_cache.py)
     config_dict = {}
     ai_config_dict = {}
     try:
-        configs = SiteConfig.query.all()
-        for c in configs:
-            config_dict[c.key] = c.value
-            
-        ai_configs = AIConfig.query.all()
-        for ac in ai_configs:
-            ai_config_dict[ac.key] = ac.value
+        config_dict, ai_config_dict = config_snapshot.get()
     except:
         pass # DB might not be ready yet
     
@@ -320,13 +551,21 @@ def inject_globals():
         is_admin=current_user.is_authenticated and current_user.is_admin
     )
 
+def news_listing():
+    """Noticias más recientes primero, sin cargar `content` (solo el extracto precalculado)."""
+    return NewsItem.query.options(load_only(
+        NewsItem.id, NewsItem.title, NewsItem.excerpt, NewsItem.reading_time,
+        NewsItem.image_filename, NewsItem.created_at,
+    )).order_by(NewsItem.created_at.desc(), NewsItem.id.desc())
+
 # =========================
 # Routes
 # =========================
 
 @app.route("/")
+@page_cache.cached("news")
 def home():
-    news = NewsItem.query.order_by(NewsItem.created_at.desc()).limit(3).all()
+    news = news_listing().limit(3).all()
     # If no config for manifesto exists, use default
     manifesto = "La Inteligencia Evolutiva es un puente entre mundos."
     
@@ -337,27 +576,31 @@ def social():
     return render_template("social.html")
 
 @app.route("/biblioteca")
+@page_cache.cached()
 def biblioteca():
     return render_template("biblioteca.html")
 
 @app.route("/biblioteca/libro/<int:libro_id>")
 def scroll_libro(libro_id):
-    filename = f"biblioteca/libro{libro_id}.html"
+    # Compiled once per template mtime (back button included), served straight from disk
     try:
-        content = render_template(filename)
-        # Unique back button for the library work
-        back_btn = """
-        <div style="position: fixed; top: 20px; left: 20px; z-index: 9999;">
-            <a href="/biblioteca" style="background: rgba(106, 90, 205, 0.9); color: white; padding: 12px 24px; border-radius: 50px; text-decoration: none; font-family: 'Segoe UI', sans-serif; font-weight: 600; backdrop-filter: blur(15px); border: 1px solid rgba(255,255,255,0.3); box-shadow: 0 10px 30px rgba(0,0,0,0.5); transition: 0.3s; display: flex; align-items: center; gap: 8px;">
-                <span>←</span> Volver a Biblioteca
-            </a>
-        </div>
-        """
-        return content.replace("<body>", f"<body>{back_btn}", 1)
+        book = books.get(libro_id)
     except Exception as e:
         return f"Libro no encontrado: {e}", 404
 
+    path, etag, encoding = book["identity"], book["etag"], None
+    for enc in ("br", "gzip"):
+        if enc in book and request.accept_encodings[enc]:
+            path, etag, encoding = book[enc], f"{book['etag']}-{enc}", enc
+            break
+    response = send_file(path, mimetype="text/html", etag=etag, conditional=True, max_age=0)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
 @app.route("/manifesto")
+@page_cache.cached()
 def manifesto():
     return render_template("manifesto.html")
 
@@ -425,6 +668,7 @@ def chat():
     return render_template("chat.html")
 
 @app.route("/radio")
+@page_cache.cached("radio")
 def radio():
     station = RadioStation.query.filter_by(is_active=True).first()
     if not station:
@@ -435,6 +679,7 @@ def radio():
     return render_template("radio.html", station=station)
 
 @app.route("/media")
+@page_cache.cached("podcast", "music")
 def media_hub():
     podcasts = Podcast.query.order_by(Podcast.created_at.desc()).limit(3).all()
     music_items = MusicItem.query.order_by(MusicItem.created_at.desc()).limit(3).all()
@@ -450,25 +695,30 @@ def media_hub():
     return render_template("media.html", podcasts=podcasts, music_items=music_items, books=books)
 
 @app.route("/podcast")
+@page_cache.cached("podcast")
 def podcast_list():
     podcasts = Podcast.query.order_by(Podcast.created_at.desc()).all()
     return render_template("podcast_list.html", podcasts=podcasts)
 
 @app.route("/music")
+@page_cache.cached("music")
 def music_list():
     music = MusicItem.query.order_by(MusicItem.created_at.desc()).all()
     return render_template("music_list.html", music=music)
 
 @app.route("/about")
+@page_cache.cached()
 def about():
     return render_template("about.html")
 
 @app.route("/noticias")
+@page_cache.cached("news")
 def noticias():
-    items = NewsItem.query.order_by(NewsItem.created_at.desc()).all()
-    return render_template("noticias.html", items=items)
+    page = news_listing().paginate(page=request.args.get("page", 1, type=int), per_page=NEWS_PAGE_SIZE, error_out=False)
+    return render_template("noticias.html", items=page.items, page=page)
 
 @app.route("/noticia_detalle/<int:item_id>")
+@page_cache.cached("news")
 def noticia_detalle(item_id):
     item = NewsItem.query.get_or_404(item_id)
     return render_template("noticia_detalle.html", item=item)
@@ -499,30 +749,120 @@ def models_hub():
 
 @app.route("/api/telemetry", methods=["POST"])
 def api_telemetry():
-    data = request.json
+    # Accepts a single event or a batch (JSON array); buffered and bulk-inserted in the background
+    data = request.get_json(silent=True)
     if not data:
         return jsonify({"status": "ignored"}), 400
-    
-    from models import TelemetryData
-    try:
-        new_tel = TelemetryData(
-            model_name=data.get("model", "unknown"),
-            latency_ms=data.get("latency_ms", 0),
-            tokens_per_sec=data.get("tokens_per_sec", 0.0)
-        )
-        db.session.add(new_tel)
-        db.session.commit()
-        return jsonify({"status": "recorded"}), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    batch = data if isinstance(data, list) else [data]
+    if len(batch) > TELEMETRY_MAX_BATCH:
+        return jsonify({"error": f"Máximo {TELEMETRY_MAX_BATCH} eventos por envío"}), 413
+
+    events, rejected = [], 0
+    for item in batch:
+        try:
+            events.append(parse_event(item))
+        except (ValueError, TypeError):
+            rejected += 1
+    telemetry.add(events)
+    return jsonify({"status": "accepted", "accepted": len(events), "rejected": rejected}), 202
+
+@app.route("/api/admin/telemetry")
+@login_required
+def api_admin_telemetry():
+    """Agregados por minuto: ?minutes=60&model=<nombre>"""
+    from models import TelemetryMinute
+    if not current_user.is_admin:
+        return "Unauthorized", 403
+    minutes = min(max(request.args.get("minutes", 60, type=int), 1), 7 * 24 * 60)
+    q = TelemetryMinute.query.filter(TelemetryMinute.minute >= datetime.utcnow() - timedelta(minutes=minutes))
+    model = request.args.get("model")
+    if model:
+        q = q.filter(TelemetryMinute.model_name == model)
+    rows = q.order_by(TelemetryMinute.minute.asc(), TelemetryMinute.model_name.asc()).all()
+    return jsonify({
+        "buffer": telemetry.stats(),
+        "aggregates": [{
+            "model": r.model_name,
+            "minute": r.minute.isoformat(),
+            "count": r.count,
+            "latency_p50": r.latency_p50,
+            "latency_p95": r.latency_p95,
+            "tokens_per_sec_mean": round(r.tokens_per_sec_mean, 2) if r.tokens_per_sec_mean is not None else None,
+        } for r in rows],
+    })
+
+@app.route("/api/admin/llm/stats")
+@login_required
+def api_llm_stats():
+    if not current_user.is_admin:
+        return "Unauthorized", 403
+    return jsonify({**llm.stats(), "response_cache": response_cache.stats()})
+
+@app.route("/api/admin/prompt/stats")
+@login_required
+def api_prompt_stats():
+    if not current_user.is_admin:
+        return "Unauthorized", 403
+    return jsonify({**prompt_stats.stats(), "compiled_cache": prompt_cache.stats()})
+
+@app.route("/api/admin/cache/stats")
+@login_required
+def api_cache_stats():
+    if not current_user.is_admin:
+        return "Unauthorized", 403
+    return jsonify({"pages": page_cache.stats()})
+
+@app.route("/api/admin/speech/stats")
+@login_required
+def api_speech_stats():
+    if not current_user.is_admin:
+        return "Unauthorized", 403
+    stats = {"local": speech_models.stats(), "phrase_cache": tts_cache.stats()}
+    if speech_service:
+        try:
+            stats["service"] = speech_service.stats()
+        except SpeechUnavailable as e:
+            stats["service"] = {"error": str(e)}
+    return jsonify(stats)
+
+@app.route("/api/admin/jobs/stats")
+@login_required
+def api_jobs_stats():
+    if not current_user.is_admin:
+        return "Unauthorized", 403
+    return jsonify({**jobs.metrics(), "turn_writer": turns.stats()})
 
 @app.route("/gallery")
+# Sin etiqueta: la app no tiene ruta de escritura para la galería (se edita
+# fuera, en la BD), así que se refresca solo por PAGE_CACHE_TTL
+@page_cache.cached()
 def gallery():
     items = GalleryItem.query.order_by(GalleryItem.created_at.desc()).all()
     return render_template("gallery.html", items=items)
 
+TTS_AUDIO_MAX_AGE = 365 * 24 * 3600
+
+def cached_synthesize_wav(text: str):
+    return tts_cache.get_or_synthesize(text, synthesize_wav)[1]
+
+def speech_audio_url(text: str):
+    """URL del audio de `text`: /audio/tts/<hash>.wav si la frase quedó en la caché de disco
+    (servible desde cualquier worker); si no, WAV inline."""
+    key, wav = tts_cache.get_or_synthesize(text, synthesize_wav)
+    return tts_cache.url(key) if key else wav_data_url(wav)
+
 @app.route("/audio/<path:filename>")
 def serve_audio(filename: str):
+    if filename.startswith("tts/") and filename.endswith(".wav"):
+        # Audio direccionado por contenido: el hash es un ETag fuerte y no caduca
+        wav = tts_cache.get(filename[4:-4])
+        if wav is None:
+            abort(404)
+        response = send_file(io.BytesIO(wav), mimetype="audio/wav", etag=filename[4:-4],
+                             conditional=True, max_age=TTS_AUDIO_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
     return send_from_directory(str(AUDIO_DIR), filename)
 
 @app.post("/process")
@@ -530,19 +870,47 @@ def process_audio():
     if "audio" not in request.files:
         return jsonify({"error": "No audio uploaded"}), 400
 
-    audio_file = request.files["audio"]
-    if not audio_file:
+    # Todo en memoria: upload -> ffmpeg por pipe -> Whisper, Piper -> WAV inline (o caché de frases)
+    audio = request.files["audio"].read()
+    if not audio:
         return jsonify({"error": "Empty file"}), 400
 
-    in_path = save_uploaded_audio(audio_file)
-    transcript = transcribe_audio(str(in_path))
-    response_text = lm_studio_chat(transcript)
+    try:
+        transcript = transcribe_audio(audio)
+        response_text = lm_studio_chat(transcript)
 
-    wav_path = synthesize_speech(response_text)
-    audio_url = save_tts_audio(wav_path)
+        audio_url = speech_audio_url(response_text)
+    except SpeechUnavailable as e:
+        return jsonify({"error": f"Servicio de voz no disponible: {e}"}), 503
 
     return jsonify({"transcript": transcript, "response": response_text, "audio_url": audio_url})
 
+@app.post("/process/stream")
+def process_audio_stream():
+    """Como /process, pero en SSE: transcripción, deltas del LLM y un WAV por frase.
+
+    La síntesis de cada frase empieza en cuanto el LLM la cierra, así que el
+    cliente puede reproducir la primera mientras se genera el resto.
+    """
+    audio_file = request.files.get("audio")
+    audio = audio_file.read() if audio_file else b""
+    if not audio:
+        return jsonify({"error": "No audio uploaded"}), 400
+
+    try:
+        transcript = transcribe_audio(audio)
+    except SpeechUnavailable as e:
+        return jsonify({"error": f"Servicio de voz no disponible: {e}"}), 503
+    raw_generator = lm_studio_chat(transcript, stream=True)
+    db.session.close()
+
+    def generate():
+        yield sse_frame({"transcript": transcript})
+        yield from speak_stream(raw_generator, cached_synthesize_wav)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/api/chat")
 def api_chat():
     data = request.json
@@ -568,95 +936,106 @@ def api_chat_stream():
         return jsonify({"error": "No message provided"}), 400
 
     prev_messages = []
-    active_session = None
+    summary = None
+    is_new = not bool(session_id)
+    started_at = datetime.utcnow()
 
     if current_user.is_authenticated:
-        from models import ChatSession
-        # Get or create session
-        if session_id:
-            active_session = ChatSession.query.filter_by(id=session_id, user_id=current_user.id).first()
-        
-        if not active_session:
-            # Create a new session if none provided or not found
-            active_session = ChatSession(user_id=current_user.id, title=prompt[:50] + "...")
-            db.session.add(active_session)
-            db.session.commit()
-            session_id = active_session.id
+        session_id, prev_messages, summary = begin_chat_turn(current_user, prompt, session_id)
 
-        # User message save
-        user_msg = ChatMessage(user_id=current_user.id, session_id=session_id, role="user", content=prompt)
-        db.session.add(user_msg)
-        db.session.commit() # Commit user message so it's persistent even if stream fails
-        
-        # History fetch for THIS session (latest 15 messages)
-        # Since we just committed the user message, it will be index 0 (descending)
-        history = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.timestamp.desc()).limit(16).all()
-        # history[0] is the current user message, so we take history[1:] for context
-        for msg in reversed(history[1:]): 
-            prev_messages.append({"role": msg.role, "content": msg.content})
-
-    raw_generator = lm_studio_chat(prompt, stream=True, use_search=use_search, history=prev_messages)
+    raw_generator = lm_studio_chat(prompt, stream=True, use_search=use_search, history=prev_messages, summary=summary)
+    # The payload is built: give the SQLite connection back to the pool for the
+    # whole stream instead of holding it (and a read snapshot) until teardown.
+    db.session.close()
     
     def wrapped_generator():
-        full_assistant_reply = ""
-        # Yield the session info first or in a special way
-        yield f"data: {json.dumps({'session_id': session_id, 'is_new': not bool(request.args.get('session_id'))})}\n\n"
-        
-        for chunk in raw_generator():
-            yield chunk
-            if 'full_content' in chunk:
-                try:
-                    data = json.loads(chunk.split('data: ')[1])
-                    if data.get('done'):
-                        full_assistant_reply = data.get('full_content')
-                except:
-                    pass
-        
-        if current_user.is_authenticated and full_assistant_reply:
-            assistant_msg = ChatMessage(user_id=current_user.id, session_id=session_id, role="assistant", content=full_assistant_reply)
-            db.session.add(assistant_msg)
-            db.session.commit()
-            
-            # If it's a new session, auto-title it more intelligently in the background
-            is_new = not bool(request.args.get('session_id'))
-            if is_new:
-                import threading
-                threading.Thread(target=auto_title_session, args=(session_id, prompt)).start()
-
-            # Auto-extract memory if enabled
-            if current_user.enable_memory:
-                import threading
-                threading.Thread(target=auto_save_memory, args=(current_user.id, prompt, full_assistant_reply)).start()
-
-    return Response(stream_with_context(wrapped_generator()), mimetype='text/event-stream')
+        relay = SSERelay()
+        try:
+            # Yield the session info first or in a special way
+            yield sse_frame({'session_id': session_id, 'is_new': is_new})
+
+            yield from raw_generator(relay)
+        finally:
+            # The user message is kept even if the stream fails or the client leaves;
+            # the reply only when it arrived complete
+            if current_user.is_authenticated:
+                full_assistant_reply = relay.text() if relay.completed else ""
+                finish_chat_turn(current_user, session_id, prompt, full_assistant_reply, is_new, started_at)
+
+    # No buffering/compression by nginx: tokens must reach the client as they are generated
+    return Response(stream_with_context(wrapped_generator()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def conditional_json(data):
+    """JSON con ETag; devuelve 304 si coincide con If-None-Match."""
+    response = jsonify(data)
+    response.add_etag()
+    # Privado y siempre revalidado: el navegador reenvía If-None-Match por su cuenta
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
 
 @app.route("/api/chats")
 def api_chats():
+    """Sesiones del usuario, más recientes primero, paginadas por cursor (created_at, id).
+
+    ?limit=N&cursor=<next_cursor>&fields=id,title,created_at
+    """
     from models import ChatSession
     if not current_user.is_authenticated:
-        return jsonify([])
-    sessions = ChatSession.query.filter_by(user_id=current_user.id).order_by(ChatSession.created_at.desc()).all()
-    return jsonify([{
-        "id": s.id,
-        "title": s.title,
-        "created_at": s.created_at.isoformat()
-    } for s in sessions])
+        return jsonify({"items": [], "next_cursor": None})
+    limit = parse_limit(request.args.get("limit"), CHATS_PAGE_SIZE, 100)
+    fields = parse_fields(request.args.get("fields"), SESSION_FIELDS, SESSION_FIELDS)
+
+    q = ChatSession.query.with_entities(ChatSession.id, ChatSession.title, ChatSession.created_at) \
+        .filter(ChatSession.user_id == current_user.id)
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            q = q.filter(keyset_before(ChatSession.created_at, ChatSession.id, cursor))
+        except BadCursor as e:
+            return jsonify({"error": str(e)}), 400
+    rows = q.order_by(ChatSession.created_at.desc(), ChatSession.id.desc()).limit(limit + 1).all()
+
+    page = rows[:limit]
+    values = {"created_at": lambda r: r.created_at.isoformat()}
+    return conditional_json({
+        "items": [{f: values[f](r) if f in values else getattr(r, f) for f in fields} for r in page],
+        "next_cursor": encode_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None,
+    })
 
 @app.route("/api/chats/<int:sid>")
 def api_chat_detail(sid):
+    """Mensajes de una sesión, paginados hacia atrás por cursor (timestamp, id).
+
+    La primera página trae los más recientes; cada página se devuelve en orden
+    cronológico. ?limit=N&cursor=<next_cursor>&fields=id,role,content,timestamp
+    """
     from models import ChatSession, ChatMessage
     if not current_user.is_authenticated:
         return jsonify({"error": "Login required"}), 401
-    session = ChatSession.query.filter_by(id=sid, user_id=current_user.id).first_or_404()
-    messages = ChatMessage.query.filter_by(session_id=sid).order_by(ChatMessage.timestamp.asc()).all()
-    return jsonify({
+    session = ChatSession.query.with_entities(ChatSession.id, ChatSession.title) \
+        .filter_by(id=sid, user_id=current_user.id).first_or_404()
+    limit = parse_limit(request.args.get("limit"), MESSAGES_PAGE_SIZE, 200)
+    fields = parse_fields(request.args.get("fields"), MESSAGE_FIELDS, ("role", "content", "timestamp"))
+
+    # Solo se cargan las columnas pedidas (+ la clave del cursor)
+    columns = [ChatMessage.id, ChatMessage.timestamp] + [getattr(ChatMessage, f) for f in fields if f in ("role", "content")]
+    q = ChatMessage.query.with_entities(*columns).filter(ChatMessage.session_id == sid)
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            q = q.filter(keyset_before(ChatMessage.timestamp, ChatMessage.id, cursor))
+        except BadCursor as e:
+            return jsonify({"error": str(e)}), 400
+    rows = q.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+
+    page = rows[:limit]
+    values = {"timestamp": lambda m: m.timestamp.isoformat()}
+    return conditional_json({
         "id": session.id,
         "title": session.title,
-        "messages": [{
-            "role": m.role,
-            "content": m.content,
-            "timestamp": m.timestamp.isoformat()
-        } for m in messages]
+        "messages": [{f: values[f](m) if f in values else getattr(m, f) for f in fields} for m in reversed(page)],
+        "next_cursor": encode_cursor(page[-1].timestamp, page[-1].id) if len(rows) > limit else None,
     })
 
 @app.route("/api/chats/<int:sid>/delete", methods=["POST"])
@@ -681,8 +1060,11 @@ def update_config():
     else:
         new_conf = SiteConfig(key=key, value=value)
         db.session.add(new_conf)
+    bump_generation(SITE_CONFIG_GENERATION)
     
     db.session.commit()
+    config_snapshot.invalidate()
+    page_cache.invalidate()
     flash("Configuración actualizada")
     return redirect(url_for('dashboard'))
 
@@ -693,7 +1075,9 @@ def add_radio():
     url = request.form.get("url")
     new_station = RadioStation(name=name, stream_url=url)
     db.session.add(new_station)
+    bump_generation("radio")
     db.session.commit()
+    page_cache.invalidate()
     return redirect(url_for('dashboard'))
 
 @app.route("/admin/ai-config/update", methods=["POST"])
@@ -709,7 +1093,10 @@ def update_ai_config():
     else:
         new_conf = AIConfig(key=key, value=value)
         db.session.add(new_conf)
+    bump_generation(SITE_CONFIG_GENERATION)
     db.session.commit()
+    config_snapshot.invalidate()
+    page_cache.invalidate()
     flash("Configuración de IA actualizada")
     return redirect(url_for('dashboard'))
 
@@ -720,9 +1107,11 @@ def add_news():
         return "Unauthorized", 403
     title = request.form.get("title")
     content = request.form.get("content")
-    new_item = NewsItem(title=title, content=content)
+    new_item = fill_news_summary(NewsItem(title=title, content=content))
     db.session.add(new_item)
+    bump_generation("news")
     db.session.commit()
+    page_cache.invalidate()
     flash("Crónica publicada exitosamente.")
     return redirect(url_for('dashboard'))
 
@@ -744,7 +1133,9 @@ def add_music():
         rel_path = f"uploads/music/{filename}"
         new_music = MusicItem(title=title, artist=artist, filename=rel_path)
         db.session.add(new_music)
+        bump_generation("music")
         db.session.commit()
+        page_cache.invalidate()
         flash("Obra sonora subida exitosamente.")
     else:
         flash("No se proporcionó ningún archivo de audio.")
@@ -769,7 +1160,9 @@ def add_podcast():
         rel_path = f"uploads/podcasts/{filename}"
         new_podcast = Podcast(title=title, description=desc, audio_filename=rel_path)
         db.session.add(new_podcast)
+        bump_generation("podcast")
         db.session.commit()
+        page_cache.invalidate()
         flash("iEpodcast subido exitosamente.")
     
     return redirect(url_for('dashboard'))
@@ -787,6 +1180,7 @@ def save_settings():
     current_user.user_context = request.form.get("user_context")
     current_user.response_style = request.form.get("response_style")
     current_user.enable_memory = request.form.get("enable_memory") == "true"
+    current_user.prompt_version = (current_user.prompt_version or 0) + 1
     
     db.session.commit()
     flash("Configuración de evolución guardada.")
@@ -800,6 +1194,7 @@ def api_save_settings():
     current_user.user_context = data.get("user_context")
     current_user.response_style = data.get("response_style")
     current_user.enable_memory = data.get("enable_memory") == True
+    current_user.prompt_version = (current_user.prompt_version or 0) + 1
     
     db.session.commit()
     return jsonify({"status": "success", "nickname": current_user.nickname})
@@ -811,13 +1206,15 @@ def delete_memory(item_id):
     mem = UserMemory.query.get(item_id)
     if mem and mem.user_id == current_user.id:
         mem.is_active = False
+        bump_prompt_version(current_user.id)
         db.session.commit()
         return jsonify({"status": "deleted"}), 200
     return jsonify({"error": "Unauthorized"}), 403
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        for name in migrate(db.engine):
+            print(f"✅ Migración aplicada: {name}")
         # Create Admin if not exists
         from werkzeug.security import generate_password_hash
         if not User.query.filter_by(username="admin").first():
@@ -930,7 +1327,7 @@ if __name__ == "__main__":
                 </div>
                 """
             )
-            db.session.add(first_news)
+            db.session.add(fill_news_summary(first_news))
             db.session.commit()
             print("📰 First news post seeded with FULL LITERAL text.")
 
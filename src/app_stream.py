@@ -0,0 +1,182 @@
+# =========================
+# iE - Async Streaming Gateway
+# src/app_stream.py
+# =========================
+# Sirve /api/chat/stream con asyncio (aiohttp): un solo proceso mantiene
+# cientos de streams SSE abiertos mientras LM Studio genera. El resto de la
+# app sigue en Flask/gunicorn; nginx enruta solo este path hacia aquí.
+#
+#   gunicorn --chdir src "app_stream:make_app()" \
+#       --worker-class aiohttp.GunicornWebWorker --bind 127.0.0.1:5002
+#
+# Eventos SSE (los mismos que la ruta Flask): {"session_id", "is_new"}, luego
+# {"content": delta}..., y al final {"done": true} si la respuesta llegó
+# completa o {"error": mensaje} si no. La respuesta completa no se reenvía:
+# el cliente la reconstruye con los deltas.
+#
+# Este proceso solo encola jobs (titulado, memoria...): los ejecutan los
+# workers de la app Flask, que arrancan su cola en start_job_workers.
+
+import os
+import time
+import asyncio
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from aiohttp import web
+
+from app_flask import app as flask_app, db, llm, prompt_stats, build_chat_payload, begin_chat_turn, finish_chat_turn
+from llm_client import LM_CONNECT_TIMEOUT, LM_STREAM_READ_TIMEOUT
+from sse_relay import SSERelay, sse_frame
+from models import User
+from migrations import check_schema
+
+# Hilos para el trabajo bloqueante (SQLite, búsqueda web); el event loop nunca toca la DB
+DB_THREADS = int(os.getenv("STREAM_DB_THREADS", "8"))
+UNAVAILABLE_MSG = "No se pudo conectar con el núcleo evolutivo (LM Studio). Asegúrate de que esté encendido y el modelo cargado."
+
+
+def session_user_id(request: web.Request):
+    """Lee el user_id de Flask-Login desde la cookie de sesión firmada de Flask."""
+    cookie = request.cookies.get(flask_app.config.get("SESSION_COOKIE_NAME", "session"))
+    if not cookie:
+        return None
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        data = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return None
+    user_id = data.get("_user_id")
+    return int(user_id) if user_id else None
+
+
+# =========================
+# Trabajo bloqueante (se ejecuta en el executor)
+# =========================
+def _prepare_turn(user_id, prompt, session_id, use_search):
+    with flask_app.app_context():
+        user = db.session.get(User, user_id) if user_id else None
+        history, summary = [], None
+        if user is not None:
+            session_id, history, summary = begin_chat_turn(user, prompt, session_id)
+        payload = build_chat_payload(prompt, user, stream=True, use_search=use_search, history=history, summary=summary)
+        return session_id, payload
+
+
+def _complete_turn(user_id, session_id, prompt, reply, is_new, started_at):
+    with flask_app.app_context():
+        user = db.session.get(User, user_id)
+        if user is not None:
+            finish_chat_turn(user, session_id, prompt, reply, is_new, started_at)
+
+
+# =========================
+# Handler
+# =========================
+async def api_chat_stream(request: web.Request):
+    prompt = request.query.get("message", "")
+    use_search = request.query.get("search", "false").lower() == "true"
+    session_id = request.query.get("session_id")
+    is_new = not bool(session_id)
+    started_at = datetime.utcnow()
+
+    if not prompt:
+        return web.json_response({"error": "No message provided"}, status=400)
+
+    loop = asyncio.get_running_loop()
+    executor = request.app["db_executor"]
+    user_id = session_user_id(request)
+
+    session_id, payload = await loop.run_in_executor(
+        executor, _prepare_turn, user_id, prompt, session_id, use_search
+    )
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    await response.prepare(request)
+    await response.write(sse_frame({"session_id": session_id, "is_new": is_new}))
+
+    relay = SSERelay()
+    prefix_hit = prompt_stats.observe(payload["messages"])
+    started = time.perf_counter()
+    first = True
+    # Solo se persiste la respuesta si llegó completa (hasta `data: [DONE]`)
+    reply = ""
+    persist = None
+    try:
+        async with request.app["llm_session"].post(llm.endpoint, json=payload) as upstream:
+            if upstream.status >= 400:
+                await response.write(sse_frame({"error": f"LM Studio respondió {upstream.status}"}))
+            else:
+                completed = False
+                async for line in upstream.content:
+                    if line.startswith(b"data: [DONE]"):
+                        completed = True
+                        break
+                    frame = relay.feed(line)
+                    if frame:
+                        if first:
+                            prompt_stats.record_ttft(prefix_hit, (time.perf_counter() - started) * 1000)
+                            first = False
+                        await response.write(frame)
+
+                if completed:
+                    await response.write(relay.done())
+                    reply = relay.text()
+                else:
+                    # LM Studio cerró el stream sin terminar
+                    await response.write(sse_frame({"error": UNAVAILABLE_MSG}))
+    except ConnectionResetError:
+        # El cliente cerró la pestaña (va antes: ClientConnectionResetError es
+        # también ClientError): no persistimos una respuesta incompleta
+        pass
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        # Conexión rechazada/cortada o cuerpo truncado (ClientPayloadError): el
+        # mismo error que la ruta Flask con LLMUnavailable
+        try:
+            await response.write(sse_frame({"error": UNAVAILABLE_MSG}))
+        except ConnectionResetError:
+            pass
+    finally:
+        # El mensaje del usuario se guarda siempre (también si el handler se cancela)
+        if user_id:
+            persist = loop.run_in_executor(
+                executor, _complete_turn, user_id, session_id, prompt, reply, is_new, started_at
+            )
+
+    if persist is not None:
+        await persist
+    return response
+
+
+# =========================
+# App factory
+# =========================
+async def _client_session(app: web.Application):
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=0, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=LM_CONNECT_TIMEOUT, sock_read=LM_STREAM_READ_TIMEOUT)
+    app["llm_session"] = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    app["db_executor"] = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="ie-db")
+    yield
+    await app["llm_session"].close()
+    app["db_executor"].shutdown(wait=True)
+
+
+def make_app() -> web.Application:
+    # Igual que la app Flask: no arranca contra una BD sin migrar
+    with flask_app.app_context():
+        check_schema(db.engine)
+    app = web.Application()
+    app.cleanup_ctx.append(_client_session)
+    app.router.add_get("/api/chat/stream", api_chat_stream)
+    return app
+
+
+if __name__ == "__main__":
+    port = int(os.getenv("STREAM_PORT", "5002"))
+    print(f"🌊 iE stream gateway corriendo en http://localhost:{port}")
+    web.run_app(make_app(), host="0.0.0.0", port=port)
@@ -0,0 +1,47 @@
+"""Audio en memoria para la ruta de voz: sin ficheros temporales entre pasos."""
+import base64
+import struct
+import subprocess
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Whisper trabaja a 16 kHz mono
+WHISPER_SAMPLE_RATE = 16000
+WAV_HEADER_BYTES = 44
+
+
+def decode_audio(data: bytes, sample_rate: int = WHISPER_SAMPLE_RATE):
+    """Decodifica el audio subido (webm, ogg, wav...) a float32 mono con ffmpeg por pipes.
+
+    Es lo mismo que hace `whisper.load_audio`, pero desde memoria.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "pipe:1",
+    ]
+    proc = subprocess.run(cmd, input=bytes(data), capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg no pudo decodificar el audio: {proc.stderr.decode(errors='ignore')[-300:]}")
+    return np.frombuffer(proc.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def pack_wav_header(buf, sample_rate: int, data_size: int):
+    """Escribe la cabecera WAV (PCM int16 mono) en los primeros 44 bytes de `buf`."""
+    struct.pack_into(
+        "<4sI4s4sIHHIIHH4sI", buf, 0,
+        b"RIFF", 36 + data_size, b"WAVE", b"fmt ", 16, 1, 1,
+        sample_rate, 2 * sample_rate, 2, 16, b"data", data_size,
+    )
+
+
+def wav_data_url(wav) -> str:
+    """WAV inline para la respuesta JSON (None si no hay audio).
+
+    Vale en cualquier worker y no necesita una segunda petición ni un fichero.
+    """
+    if not wav:
+        return None
+    return "data:audio/wav;base64," + base64.b64encode(wav).decode("ascii")
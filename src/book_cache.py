@@ -0,0 +1,102 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Botón de vuelta que se inyecta en cada libro de la biblioteca
+BACK_BUTTON = """
+        <div style="position: fixed; top: 20px; left: 20px; z-index: 9999;">
+            <a href="/biblioteca" style="background: rgba(106, 90, 205, 0.9); color: white; padding: 12px 24px; border-radius: 50px; text-decoration: none; font-family: 'Segoe UI', sans-serif; font-weight: 600; backdrop-filter: blur(15px); border: 1px solid rgba(255,255,255,0.3); box-shadow: 0 10px 30px rgba(0,0,0,0.5); transition: 0.3s; display: flex; align-items: center; gap: 8px;">
+                <span>←</span> Volver a Biblioteca
+            </a>
+        </div>
+        """
+
+# (Content-Encoding, extensión) en orden de preferencia
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class BookCache:
+    """Libros de la biblioteca compilados a disco: renderizados una vez con el
+    botón de vuelta y guardados también en gzip/brotli.
+
+    Los ficheros se nombran por el hash del contenido (ETag fuerte) y un
+    manifiesto por libro guarda el mtime de la plantilla: si cambia, el libro
+    se recompila en la siguiente petición. Varios workers pueden compilar a la
+    vez sin pisarse (escritura atómica, mismo contenido, mismo nombre).
+    """
+
+    def __init__(self, jinja_env, templates_dir, out_dir):
+        self.jinja_env = jinja_env
+        self.templates_dir = Path(templates_dir)
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self._books = {}
+        self._lock = threading.Lock()
+
+    def get(self, libro_id: int) -> dict:
+        """{"etag", "identity": path, "gzip"/"br": path} del libro, compilándolo si hace falta.
+
+        Lanza FileNotFoundError si no existe la plantilla.
+        """
+        name = f"libro{libro_id}"
+        st = os.stat(self.templates_dir / "biblioteca" / f"{name}.html")
+        source = [st.st_mtime_ns, st.st_size]
+
+        book = self._books.get(name)
+        if book and book["source"] == source:
+            return book
+        with self._lock:
+            book = self._load_manifest(name, source) or self._build(name, source)
+            self._books[name] = book
+        return book
+
+    def _load_manifest(self, name, source):
+        try:
+            manifest = json.loads((self.out_dir / f"{name}.json").read_text())
+        except (OSError, ValueError):
+            return None
+        if manifest.get("source") != source:
+            return None
+        book = self._variants(name, manifest["etag"], source)
+        return book if os.path.exists(book["identity"]) else None
+
+    def _variants(self, name, etag, source):
+        base = self.out_dir / f"{name}.{etag}.html"
+        book = {"etag": etag, "source": source, "identity": str(base)}
+        for encoding, ext in ENCODINGS:
+            path = f"{base}{ext}"
+            if os.path.exists(path):
+                book[encoding] = path
+        return book
+
+    def _build(self, name, source):
+        html = self.jinja_env.get_template(f"biblioteca/{name}.html").render()
+        body = html.replace("<body>", f"<body>{BACK_BUTTON}", 1).encode("utf-8")
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        base = self.out_dir / f"{name}.{etag}.html"
+
+        self._write(base, body)
+        self._write(Path(f"{base}.gz"), gzip.compress(body, compresslevel=9, mtime=0))
+        if brotli is not None:
+            self._write(Path(f"{base}.br"), brotli.compress(body, quality=11))
+        # Las versiones anteriores del libro ya no se sirven
+        for old in self.out_dir.glob(f"{name}.*.html*"):
+            if not old.name.startswith(base.name):
+                old.unlink(missing_ok=True)
+        self._write(self.out_dir / f"{name}.json", json.dumps({"source": source, "etag": etag}).encode())
+        print(f"📚 Libro {name} compilado ({len(body) // 1024} KB, etag {etag[:8]}).")
+        return self._variants(name, etag, source)
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
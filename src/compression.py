@@ -0,0 +1,138 @@
+import os
+import gzip
+import mimetypes
+
+from flask import request, send_file, abort
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "500"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/css", "text/plain", "text/xml", "text/javascript",
+    "application/json", "application/javascript", "application/xml",
+    "application/manifest+json", "image/svg+xml",
+}
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".json", ".svg", ".txt", ".xml", ".map", ".ico"}
+
+
+def available_encodings():
+    """(Content-Encoding, extensión) soportados, en orden de preferencia."""
+    return ((("br", ".br"),) if brotli is not None else ()) + (("gzip", ".gz"),)
+
+
+def compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    # Los estáticos se comprimen una vez: nivel máximo. Lo dinámico, rápido.
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if static else COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if static else COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def precompress_static(static_dir, min_size: int = COMPRESS_MIN_SIZE) -> int:
+    """Escribe `.gz`/`.br` junto a cada estático comprimible que no los tenga al día."""
+    written = 0
+    for root, _, files in os.walk(static_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            st = os.stat(path)
+            if st.st_size < min_size:
+                continue
+            data = None
+            for encoding, ext in available_encodings():
+                target = path + ext
+                if os.path.exists(target) and os.path.getmtime(target) >= st.st_mtime:
+                    continue
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                tmp = f"{target}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(compress(data, encoding, static=True))
+                os.replace(tmp, target)
+                written += 1
+    return written
+
+
+class ResponseCompressor:
+    """Compresión gzip/brotli negociada + ETag/304 para respuestas dinámicas,
+    y estáticos servidos desde sus variantes precomprimidas.
+
+    Nunca toca respuestas en streaming (SSE del chat, ficheros) ni las que ya
+    traen Content-Encoding. Al comprimir, el ETag pasa a débil, como hace nginx.
+    """
+
+    def __init__(self, app=None, min_size: int = COMPRESS_MIN_SIZE):
+        self.min_size = min_size
+        self.static_dir = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_dir = app.static_folder
+        if self.static_dir and os.path.isdir(self.static_dir):
+            try:
+                written = precompress_static(self.static_dir, self.min_size)
+                if written:
+                    print(f"🗜️ {written} estáticos precomprimidos.")
+            except OSError as e:
+                # static/ de solo lectura: se sirven sin variantes precomprimidas
+                print(f"⚠️ No se pudieron precomprimir los estáticos: {e}")
+            app.view_functions["static"] = self.send_static
+        app.after_request(self.after_request)
+
+    def _negotiate(self, encodings):
+        for encoding, ext in encodings:
+            if request.accept_encodings[encoding]:
+                return encoding, ext
+        return None, None
+
+    def send_static(self, filename):
+        path = safe_join(self.static_dir, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        variants = [(enc, ext) for enc, ext in available_encodings()
+                    if os.path.exists(path + ext) and os.path.getmtime(path + ext) >= os.path.getmtime(path)]
+        encoding, ext = self._negotiate(variants)
+        # send_file: ETag por fichero (distinto por variante), 304 y Range
+        response = send_file(path + ext if encoding else path, mimetype=mimetype, conditional=True)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if variants:
+            response.vary.add("Accept-Encoding")
+        return response
+
+    def after_request(self, response):
+        if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+                or response.mimetype == "text/event-stream"
+                or response.mimetype not in COMPRESSIBLE_TYPES
+                or "Content-Encoding" in response.headers):
+            return response
+
+        if not response.get_etag()[0]:
+            response.add_etag()
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+
+        response.vary.add("Accept-Encoding")
+        if response.content_length is not None and response.content_length < self.min_size:
+            return response
+        encoding, _ = self._negotiate(available_encodings())
+        if not encoding:
+            return response
+
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
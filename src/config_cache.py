@@ -0,0 +1,69 @@
+import os
+import time
+import threading
+
+from sqlalchemy import text
+
+from models import db, SiteConfig, AIConfig, CacheGeneration
+
+# Segundos entre comprobaciones de la generación (0 = en cada render)
+CONFIG_CHECK_INTERVAL = float(os.getenv("CONFIG_CHECK_INTERVAL", "1.0"))
+
+SITE_CONFIG_GENERATION = "site_config"
+
+
+def current_generation(name: str) -> int:
+    """Valor actual del contador `name` (0 si nunca se incrementó). Requiere app context."""
+    value = db.session.execute(
+        text("SELECT value FROM cache_generation WHERE name = :name"), {"name": name}
+    ).scalar()
+    return value or 0
+
+
+def bump_generation(name: str):
+    """Incrementa el contador `name` en la transacción en curso (sin commit)."""
+    updated = CacheGeneration.query.filter_by(name=name) \
+        .update({CacheGeneration.value: CacheGeneration.value + 1}, synchronize_session=False)
+    if not updated:
+        db.session.add(CacheGeneration(name=name, value=1))
+
+
+class ConfigSnapshot:
+    """Copia en proceso de SiteConfig + AIConfig para el context processor.
+
+    Se recarga solo cuando cambia la generación `site_config` en la BD
+    (una lectura por clave primaria, como mucho cada `check_interval` s).
+    """
+
+    def __init__(self, check_interval: float = CONFIG_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked_at = 0.0
+        self._site = {}
+        self._ai = {}
+
+    def get(self):
+        """(site_config, ai_config) como dicts de solo lectura. Requiere app context."""
+        now = time.monotonic()
+        with self._lock:
+            if self._generation is not None and now - self._checked_at < self.check_interval:
+                return self._site, self._ai
+
+        generation = current_generation(SITE_CONFIG_GENERATION)
+        with self._lock:
+            self._checked_at = now
+            if generation == self._generation:
+                return self._site, self._ai
+
+        site = {c.key: c.value for c in SiteConfig.query.with_entities(SiteConfig.key, SiteConfig.value)}
+        ai = {c.key: c.value for c in AIConfig.query.with_entities(AIConfig.key, AIConfig.value)}
+        with self._lock:
+            self._site, self._ai = site, ai
+            self._generation = generation
+            return site, ai
+
+    def invalidate(self):
+        """Fuerza la comprobación en el próximo render (tras un cambio en este worker)."""
+        with self._lock:
+            self._generation = None
@@ -0,0 +1,52 @@
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "15000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Negativo = KiB (SQLite); -16000 ≈ 16 MB de caché de páginas por conexión
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-16000"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAINTENANCE_INTERVAL = int(os.getenv("DB_MAINTENANCE_INTERVAL", "600"))
+
+SQLITE_PRAGMAS = (
+    # WAL: los lectores no bloquean al escritor ni viceversa
+    "PRAGMA journal_mode=WAL",
+    # En WAL, NORMAL solo arriesga la última transacción ante un corte de luz, nunca corrompe
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}",
+    f"PRAGMA mmap_size={DB_MMAP_SIZE}",
+    f"PRAGMA cache_size={DB_CACHE_SIZE}",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def engine_options() -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS para SQLite con varios workers de gunicorn."""
+    return {
+        "connect_args": {"timeout": DB_BUSY_TIMEOUT_MS / 1000, "check_same_thread": False},
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_POOL_SIZE * 2,
+        "pool_timeout": 10,
+    }
+
+
+@event.listens_for(Engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    # Se aplica en cada conexión nueva del pool; ignora motores que no sean SQLite
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def run_maintenance(engine) -> dict:
+    """Checkpoint del WAL (sin bloquear lectores) + PRAGMA optimize."""
+    with engine.connect() as conn:
+        busy, wal_pages, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        conn.exec_driver_sql("PRAGMA optimize")
+    return {"busy": busy, "wal_pages": wal_pages, "checkpointed": checkpointed}
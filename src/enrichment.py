@@ -0,0 +1,70 @@
+import json
+
+# Recorte de cada mensaje para acotar el prefill del prompt combinado
+MAX_TURN_CHARS = 1500
+
+SYSTEM_PROMPT = "Eres un asistente de metadatos minimalista. Respondes SOLO con JSON válido, sin texto adicional."
+
+INSTRUCTIONS = """Analiza cada conversación y devuelve, para cada una:
+- "title": título de máximo 4 palabras, sin puntos ni comillas (solo si se pide TITULO).
+- "facts": lista de HECHOS NUEVOS sobre el usuario (nombre, profesión, gustos, ubicación, etc) (solo si se pide HECHOS). Lista vacía si no hay hechos nuevos o personales.
+
+Formato exacto:
+{"results": [{"id": "<id>", "title": "...", "facts": ["..."]}]}"""
+
+
+def clean_title(title: str) -> str:
+    title = title.strip().replace('"', '').replace('.', '')
+    if len(title) > 40:
+        title = title[:37] + "..."
+    return title
+
+
+def _clip(text: str) -> str:
+    return text if len(text) <= MAX_TURN_CHARS else text[:MAX_TURN_CHARS] + "…"
+
+
+def build_enrichment_messages(turns: list) -> list:
+    """Un solo prompt estructurado para varios turnos (de uno o varios usuarios).
+
+    Cada turno: {"id", "prompt", "reply", "title": bool, "facts": bool}.
+    """
+    blocks = []
+    for t in turns:
+        wanted = [name for name, flag in (("TITULO", t.get("title")), ("HECHOS", t.get("facts"))) if flag]
+        blocks.append(
+            f"[id={t['id']}] Pedido: {', '.join(wanted)}\n"
+            f"Usuario: {_clip(t['prompt'])}\n"
+            f"iE: {_clip(t['reply'])}"
+        )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": INSTRUCTIONS + "\n\n" + "\n\n".join(blocks)},
+    ]
+
+
+def parse_enrichment(text: str, turns: list) -> dict:
+    """Devuelve {id: {"title": str|None, "facts": [str]}} solo con lo que se pidió."""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError(f"Respuesta de enriquecimiento sin JSON: {text[:120]!r}")
+    data = json.loads(text[start:end + 1])
+
+    items = data.get("results", []) if isinstance(data, dict) else data
+    by_id = {str(item.get("id")): item for item in items if isinstance(item, dict)}
+
+    results = {}
+    for t in turns:
+        item = by_id.get(str(t["id"]))
+        if item is None:
+            continue
+        title = item.get("title") if t.get("title") else None
+        facts = item.get("facts") if t.get("facts") else []
+        if not isinstance(facts, list):
+            facts = []
+        facts = [str(f).strip("- ").strip() for f in facts if str(f).strip()]
+        results[str(t["id"])] = {
+            "title": clean_title(title) if isinstance(title, str) and title.strip() else None,
+            "facts": [f for f in facts if f.upper() != "NONE"],
+        }
+    return results
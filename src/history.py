@@ -0,0 +1,116 @@
+import os
+
+from models import ChatMessage, SessionSummary
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding(os.getenv("TIKTOKEN_ENCODING", "cl100k_base"))
+except Exception:
+    # Sin tiktoken (o sin su caché de BPE) usamos una aproximación
+    _ENCODING = None
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2048"))
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "64"))
+# Mensajes recientes que el resumen nunca absorbe
+HISTORY_KEEP_RECENT = int(os.getenv("HISTORY_KEEP_RECENT", "6"))
+# Tope de caracteres enviados al LLM en cada pasada de resumen
+SUMMARY_MAX_INPUT_CHARS = 8000
+
+SUMMARY_SYSTEM = "Eres un asistente que resume conversaciones de forma fiel y compacta."
+SUMMARY_INSTRUCTIONS = (
+    "Actualiza el resumen de esta conversación entre el usuario e iE. Conserva hechos, "
+    "decisiones, preferencias y preguntas abiertas; omite saludos y relleno. "
+    "Máximo 200 palabras, en el idioma de la conversación."
+)
+
+# Tokens extra por mensaje (rol y separadores del chat template)
+MESSAGE_OVERHEAD = 4
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+class HistoryBuilder:
+    """Construye el historial de una sesión dentro de un presupuesto de tokens.
+
+    Rellena de más reciente a más antiguo. Si existe un checkpoint de resumen,
+    solo se consideran los mensajes posteriores y el resumen ocupa parte del
+    presupuesto. `build()` indica si quedaron mensajes fuera para que se
+    programe un nuevo checkpoint.
+    """
+
+    def __init__(self, budget: int = HISTORY_TOKEN_BUDGET, max_messages: int = HISTORY_MAX_MESSAGES,
+                 keep_recent: int = HISTORY_KEEP_RECENT):
+        self.budget = budget
+        self.max_messages = max_messages
+        self.keep_recent = keep_recent
+
+    def latest_summary(self, session_id):
+        return SessionSummary.query.filter_by(session_id=session_id) \
+            .order_by(SessionSummary.upto_message_id.desc()).first()
+
+    def build(self, session_id, before_id=None):
+        """Devuelve (history, summary_text, needs_checkpoint). Requiere app context."""
+        summary = self.latest_summary(session_id)
+        budget = self.budget - (summary.token_count if summary else 0)
+
+        q = ChatMessage.query.with_entities(ChatMessage.id, ChatMessage.role, ChatMessage.content) \
+            .filter(ChatMessage.session_id == session_id)
+        if before_id is not None:
+            q = q.filter(ChatMessage.id < before_id)
+        if summary:
+            q = q.filter(ChatMessage.id > summary.upto_message_id)
+        rows = q.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(self.max_messages + 1).all()
+
+        picked, used = [], 0
+        for row in rows[:self.max_messages]:
+            cost = count_tokens(row.content) + MESSAGE_OVERHEAD
+            if used + cost > budget:
+                break
+            picked.append({"role": row.role, "content": row.content})
+            used += cost
+
+        needs_checkpoint = len(picked) < len(rows) and len(rows) > self.keep_recent
+        picked.reverse()
+        return picked, (summary.summary if summary else None), needs_checkpoint
+
+    def pending_for_summary(self, session_id):
+        """(resumen previo, mensajes a absorber) para el próximo checkpoint."""
+        summary = self.latest_summary(session_id)
+        q = ChatMessage.query.filter(ChatMessage.session_id == session_id)
+        if summary:
+            q = q.filter(ChatMessage.id > summary.upto_message_id)
+        rows = q.order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc()).all()
+        return summary, rows[:-self.keep_recent] if self.keep_recent else rows
+
+    def summary_messages(self, previous: str, rows):
+        """Prompt para el LLM (resumen previo + mensajes nuevos) y el id del último mensaje incluido.
+
+        Se rellena de más antiguo a más reciente hasta SUMMARY_MAX_INPUT_CHARS; lo
+        que no cabe queda para el siguiente checkpoint (el resumen solo cubre hasta
+        el id devuelto). Un primer mensaje que por sí solo supera el tope se
+        recorta, para que el checkpoint siempre avance.
+        """
+        lines = []
+        total = 0
+        upto_id = None
+        for m in rows:
+            line = f"{'Usuario' if m.role == 'user' else 'iE'}: {m.content}"
+            if total + len(line) > SUMMARY_MAX_INPUT_CHARS:
+                if lines:
+                    break
+                line = line[:SUMMARY_MAX_INPUT_CHARS]
+            lines.append(line)
+            total += len(line)
+            upto_id = m.id
+        body = SUMMARY_INSTRUCTIONS
+        if previous:
+            body += f"\n\n[RESUMEN ANTERIOR]:\n{previous}"
+        body += "\n\n[MENSAJES NUEVOS]:\n" + "\n".join(lines)
+        return [
+            {"role": "system", "content": SUMMARY_SYSTEM},
+            {"role": "user", "content": body},
+        ], upto_id
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Segundos que un job puede quedar en 'running' antes de considerarlo huérfano
+# (worker reiniciado o muerto) y devolverlo a la cola.
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_type TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    dedupe_key TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_claim ON jobs (status, priority, run_at);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_jobs_dedupe ON jobs (dedupe_key)
+    WHERE dedupe_key IS NOT NULL AND status IN ('pending', 'running');
+"""
+
+
+class QueueFull(Exception):
+    """La cola alcanzó su límite de jobs pendientes (backpressure)."""
+
+
+class JobQueue:
+    """Cola de jobs persistente en SQLite con pool de workers por proceso.
+
+    - Prioridad por tipo de job (menor número = antes).
+    - Reintentos con backoff exponencial.
+    - Dedupe por `dedupe_key` mientras el job está pendiente o en curso.
+    - Los jobs sobreviven a reinicios: los 'running' huérfanos vuelven a la cola
+      (cuentan como intento) o fallan si ya agotaron `max_attempts`.
+    - `enqueue` solo inserta; los workers arrancan con `ensure_started`.
+    - `yield_to`: callable que indica que hay tráfico interactivo; mientras
+      devuelva True los workers esperan (hasta `max_defer` segundos).
+    - Tipos con `batch_size > 1` reciben una lista de payloads: si la cola se
+      acumula, el worker reserva varios jobs del mismo tipo de una vez.
+    """
+
+    def __init__(self, db_path, workers: int = 2, max_pending: int = 500,
+                 backoff_base: float = 5.0, yield_to=None, max_defer: float = 30.0):
+        self.db_path = str(db_path)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.backoff_base = backoff_base
+        self.yield_to = yield_to
+        self.max_defer = max_defer
+
+        self._handlers = {}
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    # -------------------------
+    # SQLite
+    # -------------------------
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # -------------------------
+    # Registro / encolado
+    # -------------------------
+    def register(self, job_type: str, priority: int = 10, max_attempts: int = 3, batch_size: int = 1):
+        """Decorador: registra el handler de un tipo de job.
+
+        El handler recibe el payload, o una lista de payloads si `batch_size > 1`.
+        """
+        def decorator(func):
+            self._handlers[job_type] = (func, priority, max_attempts, batch_size)
+            return func
+        return decorator
+
+    def enqueue(self, job_type: str, payload: dict, dedupe_key: str = None, delay: float = 0):
+        """Encola un job. Devuelve su id, o None si ya había uno igual (dedupe)."""
+        if job_type not in self._handlers:
+            raise KeyError(f"Tipo de job no registrado: {job_type}")
+        _, priority, max_attempts, _ = self._handlers[job_type]
+        # Solo inserta: los workers se arrancan explícitamente (ensure_started), así
+        # un proceso que solo encola (p. ej. el gateway de streams) no ejecuta jobs
+
+        conn = self._conn()
+        pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending'").fetchone()[0]
+        if pending >= self.max_pending:
+            raise QueueFull(f"{pending} jobs pendientes")
+
+        now = time.time()
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO jobs (job_type, priority, payload, dedupe_key, max_attempts, run_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_type, priority, json.dumps(payload), dedupe_key, max_attempts, now + delay, now),
+        )
+        self._wakeup.set()
+        return cur.lastrowid if cur.rowcount else None
+
+    # -------------------------
+    # Workers
+    # -------------------------
+    def ensure_started(self):
+        """Arranca los workers en este proceso (idempotente; seguro tras fork).
+
+        Devuelve True solo la primera vez en cada proceso.
+        """
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return False
+        with self._start_lock:
+            if self._started_pid == pid:
+                return False
+            self._started_pid = pid
+            self._wakeup = threading.Event()
+            for i in range(self.workers):
+                threading.Thread(target=self._worker_loop, name=f"ie-job-{i}", daemon=True).start()
+            return True
+
+    def _recover_and_cleanup(self, conn):
+        now = time.time()
+        # El intento huérfano ya se contó al reservarlo: un job que tumba a su
+        # worker no se reintenta indefinidamente
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, last_error = 'Lease expirado (worker caído)' "
+            "WHERE status = 'running' AND started_at < ? AND attempts >= max_attempts",
+            (now, now - JOB_LEASE_SECONDS),
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'pending', run_at = ? WHERE status = 'running' AND started_at < ?",
+            (now, now - JOB_LEASE_SECONDS),
+        )
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (now - JOB_RETENTION_SECONDS,),
+        )
+
+    def claim(self, job_type: str = None, limit: int = 1):
+        """Reserva atómicamente hasta `limit` jobs listos (opcionalmente de un tipo)."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if job_type:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'pending' AND run_at <= ? AND job_type = ? "
+                    "ORDER BY priority, run_at, id LIMIT ?",
+                    (now, job_type, limit),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'pending' AND run_at <= ? "
+                    "ORDER BY priority, run_at, id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now, r["id"]) for r in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def complete(self, job_id: int):
+        self._conn().execute(
+            "UPDATE jobs SET status = 'done', finished_at = ?, last_error = NULL WHERE id = ?",
+            (time.time(), job_id),
+        )
+
+    def fail(self, row, error: str):
+        """Reprograma el job con backoff exponencial o lo marca como fallido."""
+        # `row` es la fila leída antes de reservarla: este fue el intento attempts + 1
+        attempts = row["attempts"] + 1
+        now = time.time()
+        if attempts >= row["max_attempts"]:
+            self._conn().execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, last_error = ? WHERE id = ?",
+                (now, error, row["id"]),
+            )
+        else:
+            self._conn().execute(
+                "UPDATE jobs SET status = 'pending', run_at = ?, last_error = ? WHERE id = ?",
+                (now + self.backoff_base * (2 ** (attempts - 1)), error, row["id"]),
+            )
+
+    def _wait_for_idle(self):
+        if not self.yield_to:
+            return
+        deadline = time.time() + self.max_defer
+        while self.yield_to() and time.time() < deadline:
+            time.sleep(0.5)
+
+    def _worker_loop(self):
+        last_maintenance = 0.0
+        while True:
+            try:
+                if time.time() - last_maintenance > 60:
+                    self._recover_and_cleanup(self._conn())
+                    last_maintenance = time.time()
+
+                self._wait_for_idle()
+                rows = self.claim()
+                if not rows:
+                    self._wakeup.wait(timeout=2.0)
+                    self._wakeup.clear()
+                    continue
+                self.run(rows[0])
+            except Exception as e:
+                print(f"❌ Job worker error: {e}")
+                time.sleep(1.0)
+
+    def run(self, row):
+        func, _, _, batch_size = self._handlers.get(row["job_type"], (None, None, None, 1))
+        if func is None:
+            self.fail(row, f"Sin handler para {row['job_type']}")
+            return
+
+        rows = [row]
+        if batch_size > 1:
+            rows += self.claim(row["job_type"], limit=batch_size - 1)
+        try:
+            if batch_size > 1:
+                func([json.loads(r["payload"]) for r in rows])
+            else:
+                func(json.loads(row["payload"]))
+            for r in rows:
+                self.complete(r["id"])
+        except Exception as e:
+            print(f"⚠️ Job {row['job_type']}#{row['id']} (x{len(rows)}) falló (intento {row['attempts'] + 1}): {e}")
+            for r in rows:
+                self.fail(r, str(e))
+
+    # -------------------------
+    # Métricas
+    # -------------------------
+    def metrics(self, window: int = 3600) -> dict:
+        """Profundidad de cola y latencias (espera y ejecución) por tipo de job."""
+        conn = self._conn()
+        depth = {}
+        for r in conn.execute("SELECT job_type, status, COUNT(*) AS n FROM jobs GROUP BY job_type, status"):
+            depth.setdefault(r["job_type"], {})[r["status"]] = r["n"]
+
+        latency = {}
+        rows = conn.execute(
+            "SELECT job_type, COUNT(*) AS n, "
+            "AVG(started_at - created_at) AS avg_wait, MAX(started_at - created_at) AS max_wait, "
+            "AVG(finished_at - started_at) AS avg_run, MAX(finished_at - started_at) AS max_run "
+            "FROM jobs WHERE status = 'done' AND finished_at >= ? GROUP BY job_type",
+            (time.time() - window,),
+        )
+        for r in rows:
+            latency[r["job_type"]] = {
+                "completed": r["n"],
+                "avg_wait_ms": round((r["avg_wait"] or 0) * 1000, 1),
+                "max_wait_ms": round((r["max_wait"] or 0) * 1000, 1),
+                "avg_run_ms": round((r["avg_run"] or 0) * 1000, 1),
+                "max_run_ms": round((r["max_run"] or 0) * 1000, 1),
+            }
+        return {"depth": depth, "latency": latency, "workers": self.workers, "max_pending": self.max_pending}
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import threading
+
+import urllib3
+from urllib3.util import Retry, Timeout
+
+LM_CONNECT_TIMEOUT = float(os.getenv("LM_CONNECT_TIMEOUT", "5"))
+LM_READ_TIMEOUT = float(os.getenv("LM_READ_TIMEOUT", "60"))
+LM_STREAM_READ_TIMEOUT = float(os.getenv("LM_STREAM_READ_TIMEOUT", "120"))
+# Conexiones keep-alive que conserva cada worker de gunicorn
+LM_POOL_SIZE = int(os.getenv("LM_POOL_SIZE", "4"))
+
+
+class LLMError(Exception):
+    """Error devuelto por LM Studio (status HTTP o respuesta inválida)."""
+
+
+class LLMUnavailable(LLMError):
+    """LM Studio no es alcanzable (conexión rechazada, túnel caído, timeout)."""
+
+
+def get_lm_endpoint(base_url: str) -> str:
+    # Aseguramos que termine en completions si es para chat
+    url = base_url.strip()
+    if not url.endswith("/v1/chat/completions"):
+        if url.endswith("/v1"):
+            url += "/chat/completions"
+        elif url.endswith("/"):
+            url += "v1/chat/completions"
+        else:
+            url += "/v1/chat/completions"
+    return url
+
+
+class LMStudioClient:
+    """Cliente HTTP compartido con pool keep-alive hacia LM Studio.
+
+    El endpoint se resuelve una sola vez. El pool se crea de forma perezosa
+    por proceso, así cada worker de gunicorn (post-fork) tiene el suyo.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = LM_POOL_SIZE,
+                 connect_timeout: float = LM_CONNECT_TIMEOUT,
+                 read_timeout: float = LM_READ_TIMEOUT,
+                 stream_read_timeout: float = LM_STREAM_READ_TIMEOUT):
+        self.endpoint = get_lm_endpoint(base_url)
+        parsed = urllib3.util.parse_url(self.endpoint)
+        self.path = parsed.request_uri
+        self._origin = f"{parsed.scheme}://{parsed.netloc}"
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.stream_read_timeout = stream_read_timeout
+
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "streams": 0,
+            "active_streams": 0,
+            "errors": 0,
+            "total_ms": 0.0,
+        }
+
+    # -------------------------
+    # Pool
+    # -------------------------
+    def _get_pool(self):
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool_pid != pid:
+                    # block=False: si hay más peticiones concurrentes que el pool,
+                    # se abren conexiones extra que no se conservan.
+                    self._pool = urllib3.connection_from_url(
+                        self._origin,
+                        maxsize=self.pool_size,
+                        block=False,
+                        headers={"Content-Type": "application/json", "Connection": "keep-alive"},
+                        retries=Retry(total=1, connect=1, read=False, redirect=False, status=False),
+                    )
+                    self._pool_pid = pid
+        return self._pool
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _request(self, payload: dict, read_timeout: float, stream: bool):
+        body = json.dumps(payload).encode("utf-8")
+        try:
+            resp = self._get_pool().urlopen(
+                "POST",
+                self.path,
+                body=body,
+                timeout=Timeout(connect=self.connect_timeout, read=read_timeout),
+                preload_content=not stream,
+                release_conn=not stream,
+            )
+        except urllib3.exceptions.HTTPError as e:
+            self._count("errors")
+            raise LLMUnavailable(str(e)) from e
+
+        if resp.status >= 400:
+            self._count("errors")
+            detail = resp.data[:200] if not stream else b""
+            if stream:
+                resp.drain_conn()
+                resp.release_conn()
+            raise LLMError(f"LM Studio respondió {resp.status}: {detail.decode('utf-8', 'replace')}")
+        return resp
+
+    # -------------------------
+    # API
+    # -------------------------
+    def complete(self, payload: dict, timeout: float = None) -> dict:
+        """Completion no-streaming; devuelve el JSON decodificado."""
+        start = time.perf_counter()
+        self._count("requests")
+        payload = dict(payload, stream=False)
+        resp = self._request(payload, timeout or self.read_timeout, stream=False)
+        try:
+            return json.loads(resp.data)
+        except ValueError as e:
+            self._count("errors")
+            raise LLMError(f"Respuesta inválida de LM Studio: {e}") from e
+        finally:
+            self._count("total_ms", (time.perf_counter() - start) * 1000)
+
+    def complete_text(self, payload: dict, timeout: float = None) -> str:
+        data = self.complete(payload, timeout=timeout)
+        return data["choices"][0]["message"]["content"]
+
+    def stream_lines(self, payload: dict, timeout: float = None):
+        """Genera las líneas SSE crudas (bytes) del stream de LM Studio.
+
+        Se detiene en `data: [DONE]` y devuelve la conexión al pool.
+        """
+        start = time.perf_counter()
+        self._count("requests")
+        self._count("streams")
+        payload = dict(payload, stream=True)
+        resp = self._request(payload, timeout or self.stream_read_timeout, stream=True)
+        self._count("active_streams")
+        finished = False
+        try:
+            for line in resp:
+                if line.startswith(b"data: [DONE]"):
+                    break
+                yield line
+            finished = True
+        except urllib3.exceptions.HTTPError as e:
+            self._count("errors")
+            raise LLMUnavailable(str(e)) from e
+        finally:
+            self._count("active_streams", -1)
+            self._count("total_ms", (time.perf_counter() - start) * 1000)
+            if finished:
+                resp.drain_conn()
+                resp.release_conn()
+            else:
+                # Cliente desconectado o error a mitad del stream: no esperamos
+                # al resto del cuerpo, descartamos la conexión.
+                resp.close()
+                resp.release_conn()
+
+    @property
+    def active_streams(self) -> int:
+        return self._stats["active_streams"]
+
+    def stats(self) -> dict:
+        """Estadísticas del pool para este worker."""
+        with self._lock:
+            data = dict(self._stats)
+        pool = self._pool if self._pool_pid == os.getpid() else None
+        data.update({
+            "pid": os.getpid(),
+            "endpoint": self.endpoint,
+            "pool_size": self.pool_size,
+            "connections_opened": pool.num_connections if pool else 0,
+            "pool_requests": pool.num_requests if pool else 0,
+            "idle_connections": sum(1 for c in list(pool.pool.queue) if c) if pool and pool.pool else 0,
+            "avg_ms": round(data["total_ms"] / data["requests"], 1) if data["requests"] else 0.0,
+        })
+        return data
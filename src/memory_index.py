@@ -0,0 +1,133 @@
+import os
+import re
+import math
+import time
+
+from sqlalchemy import text
+
+from models import db, UserMemory
+
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "8"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "300"))
+# Vida media (días) del peso por recencia
+MEMORY_HALF_LIFE_DAYS = float(os.getenv("MEMORY_HALF_LIFE_DAYS", "30"))
+
+FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS user_memory_fts USING fts5(
+        fact, content='user_memory', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS user_memory_fts_ai AFTER INSERT ON user_memory BEGIN
+        INSERT INTO user_memory_fts(rowid, fact) VALUES (new.id, new.fact);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_memory_fts_ad AFTER DELETE ON user_memory BEGIN
+        INSERT INTO user_memory_fts(user_memory_fts, rowid, fact) VALUES ('delete', old.id, old.fact);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_memory_fts_au AFTER UPDATE OF fact ON user_memory BEGIN
+        INSERT INTO user_memory_fts(user_memory_fts, rowid, fact) VALUES ('delete', old.id, old.fact);
+        INSERT INTO user_memory_fts(rowid, fact) VALUES (new.id, new.fact);
+    END""",
+]
+
+WORD_RE = re.compile(r"\w{3,}", re.UNICODE)
+
+
+def estimate_tokens(s: str) -> int:
+    return len(s) // 4 + 1
+
+
+def memory_index_exists() -> bool:
+    """El índice FTS5 lo crea la migración 004 (si SQLite trae FTS5). Requiere app context."""
+    return db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_memory_fts'")
+    ).first() is not None
+
+
+def fts_query(prompt: str, max_terms: int = 16) -> str:
+    """Convierte el prompt en una consulta FTS5 (OR de términos entre comillas)."""
+    terms = []
+    for w in WORD_RE.findall(prompt.lower()):
+        if w not in terms:
+            terms.append(w)
+        if len(terms) >= max_terms:
+            break
+    return " OR ".join(f'"{t}"' for t in terms)
+
+
+class MemoryRetriever:
+    """Selecciona los recuerdos más relevantes del usuario dentro de un presupuesto de tokens.
+
+    Relevancia BM25 (FTS5) contra el prompt actual + peso por recencia. Si
+    todos los recuerdos caben en el presupuesto no se consulta el índice.
+    """
+
+    def __init__(self, top_k: int = MEMORY_TOP_K, token_budget: int = MEMORY_TOKEN_BUDGET,
+                 half_life_days: float = MEMORY_HALF_LIFE_DAYS):
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.half_life = half_life_days * 86400
+        self._fts_ready = None
+
+    def load_active(self, user_id) -> list:
+        """[(id, fact, extracted_at_ts)] de los recuerdos activos del usuario (serializable)."""
+        now = time.time()
+        rows = UserMemory.query.with_entities(UserMemory.id, UserMemory.fact, UserMemory.extracted_at) \
+            .filter_by(user_id=user_id, is_active=True).all()
+        return [(r.id, r.fact, r.extracted_at.timestamp() if r.extracted_at else now) for r in rows]
+
+    def _relevance(self, user_id, prompt):
+        """{memory_id: relevancia normalizada 0..1} según BM25."""
+        query = fts_query(prompt)
+        if not query:
+            return {}
+        if self._fts_ready is None:
+            self._fts_ready = memory_index_exists()
+            if not self._fts_ready:
+                # SQLite sin FTS5: solo recencia
+                print("⚠️ Índice FTS5 de recuerdos ausente, memoria por recencia")
+        if not self._fts_ready:
+            return {}
+
+        rows = db.session.execute(text(
+            "SELECT m.id, bm25(user_memory_fts) AS rank FROM user_memory_fts "
+            "JOIN user_memory m ON m.id = user_memory_fts.rowid "
+            "WHERE user_memory_fts MATCH :q AND m.user_id = :uid AND m.is_active = 1 "
+            "ORDER BY rank LIMIT :n"
+        ), {"q": query, "uid": user_id, "n": self.top_k * 4}).all()
+        if not rows:
+            return {}
+        # bm25() es negativo: más negativo = más relevante
+        best = min(r.rank for r in rows)
+        return {r.id: (r.rank / best if best else 1.0) for r in rows}
+
+    def retrieve(self, user_id, prompt: str, mems: list = None) -> list:
+        """Hechos a inyectar en el prompt, ordenados por puntuación.
+
+        `mems` permite pasar los recuerdos ya cargados (p. ej. desde la caché de prompts).
+        """
+        if mems is None:
+            mems = self.load_active(user_id)
+        if not mems:
+            return []
+
+        if len(mems) <= self.top_k and sum(estimate_tokens(m[1]) + 2 for m in mems) <= self.token_budget:
+            # Caben todos: no hace falta ranking
+            return [m[1] for m in mems]
+
+        relevance = self._relevance(user_id, prompt)
+        now = time.time()
+        scored = []
+        for mem_id, fact, ts in mems:
+            recency = math.exp(-math.log(2) * max(now - ts, 0) / self.half_life)
+            scored.append((relevance.get(mem_id, 0.0) * 0.7 + recency * 0.3, ts, fact))
+        scored.sort(reverse=True)
+
+        facts, used = [], 0
+        for _, _, fact in scored:
+            cost = estimate_tokens(fact) + 2
+            if used + cost > self.token_budget:
+                continue
+            facts.append(fact)
+            used += cost
+            if len(facts) >= self.top_k:
+                break
+        return facts
@@ -0,0 +1,310 @@
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from memory_index import FTS_SCHEMA
+from news import news_summary
+
+SCHEMA_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at DATETIME NOT NULL
+)
+"""
+
+
+class SchemaOutdated(RuntimeError):
+    """La base de datos no tiene aplicadas todas las migraciones."""
+
+
+def _columns(conn, table) -> set:
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info('{table}')")}
+
+
+def _add_columns(conn, table, columns):
+    existing = _columns(conn, table)
+    for name, ddl in columns:
+        if name not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
+def _create_indexes(conn, indexes):
+    for name, table, cols in indexes:
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(cols)})")
+
+
+# Cada migración es idempotente: se puede reaplicar sobre una BD parcialmente migrada
+# (p. ej. las que pasaron por el antiguo migrate_db.py o por db.create_all()).
+# Ninguna usa models.py: el DDL de cada versión queda fijo aunque cambien los modelos.
+
+# Esquema congelado de la versión 1 (las tablas tal como existían antes de este
+# sistema de migraciones). No se deriva de models.py: lo que se añada después
+# va en su propia migración.
+BASELINE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS user (
+        id INTEGER NOT NULL,
+        username VARCHAR(80) NOT NULL,
+        email VARCHAR(120),
+        password_hash VARCHAR(120) NOT NULL,
+        is_admin BOOLEAN,
+        created_at DATETIME,
+        nickname VARCHAR(80),
+        user_context TEXT,
+        response_style VARCHAR(20),
+        custom_instructions TEXT,
+        enable_memory BOOLEAN,
+        PRIMARY KEY (id),
+        UNIQUE (username),
+        UNIQUE (email)
+    )""",
+    """CREATE TABLE IF NOT EXISTS site_config (
+        id INTEGER NOT NULL,
+        "key" VARCHAR(50) NOT NULL,
+        value TEXT,
+        PRIMARY KEY (id),
+        UNIQUE ("key")
+    )""",
+    """CREATE TABLE IF NOT EXISTS ai_config (
+        id INTEGER NOT NULL,
+        "key" VARCHAR(100) NOT NULL,
+        value TEXT,
+        PRIMARY KEY (id),
+        UNIQUE ("key")
+    )""",
+    """CREATE TABLE IF NOT EXISTS radio_station (
+        id INTEGER NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        stream_url VARCHAR(255) NOT NULL,
+        is_active BOOLEAN,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS podcast (
+        id INTEGER NOT NULL,
+        title VARCHAR(200) NOT NULL,
+        description TEXT,
+        audio_filename VARCHAR(255) NOT NULL,
+        image_filename VARCHAR(255),
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS music_item (
+        id INTEGER NOT NULL,
+        title VARCHAR(200) NOT NULL,
+        artist VARCHAR(100),
+        filename VARCHAR(255) NOT NULL,
+        genre VARCHAR(50),
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS gallery_item (
+        id INTEGER NOT NULL,
+        title VARCHAR(100),
+        description TEXT,
+        image_filename VARCHAR(255) NOT NULL,
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS news_item (
+        id INTEGER NOT NULL,
+        title VARCHAR(200) NOT NULL,
+        content TEXT NOT NULL,
+        image_filename VARCHAR(255),
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS telemetry_data (
+        id INTEGER NOT NULL,
+        model_name VARCHAR(100),
+        latency_ms INTEGER,
+        tokens_per_sec FLOAT,
+        timestamp DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS model_package (
+        id INTEGER NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        description TEXT,
+        version VARCHAR(20),
+        file_size VARCHAR(20),
+        download_url VARCHAR(255) NOT NULL,
+        is_active BOOLEAN,
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS chat_session (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        title VARCHAR(200),
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS chat_message (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        session_id INTEGER,
+        role VARCHAR(20) NOT NULL,
+        content TEXT NOT NULL,
+        timestamp DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES user (id),
+        FOREIGN KEY(session_id) REFERENCES chat_session (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS user_memory (
+        id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        fact TEXT NOT NULL,
+        extracted_at DATETIME,
+        is_active BOOLEAN,
+        PRIMARY KEY (id),
+        FOREIGN KEY(user_id) REFERENCES user (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS session_summary (
+        id INTEGER NOT NULL,
+        session_id INTEGER NOT NULL,
+        upto_message_id INTEGER NOT NULL,
+        summary TEXT NOT NULL,
+        token_count INTEGER,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(session_id) REFERENCES chat_session (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_session_summary_session_id ON session_summary (session_id)",
+]
+
+
+def m001_baseline(conn):
+    """Tablas originales + columnas de personalización del usuario (BDs anteriores a ellas)."""
+    for stmt in BASELINE_SCHEMA:
+        conn.exec_driver_sql(stmt)
+    _add_columns(conn, "user", [
+        ("nickname", "TEXT"),
+        ("user_context", "TEXT"),
+        ("response_style", "TEXT DEFAULT 'default'"),
+        ("custom_instructions", "TEXT"),
+        ("enable_memory", "BOOLEAN DEFAULT 1"),
+    ])
+
+
+def m002_prompt_version(conn):
+    """Sello de versión de la caché de prompts compilados."""
+    _add_columns(conn, "user", [("prompt_version", "INTEGER DEFAULT 0")])
+
+
+def m003_hot_path_indexes(conn):
+    """Índices compuestos para historial, listado de chats, recuerdos y listados públicos."""
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_session_summary_session_id")
+    _create_indexes(conn, [
+        ("ix_chat_message_session_ts", "chat_message", ("session_id", "timestamp")),
+        ("ix_chat_session_user_created", "chat_session", ("user_id", "created_at")),
+        ("ix_user_memory_user_active", "user_memory", ("user_id", "is_active")),
+        ("ix_session_summary_session_upto", "session_summary", ("session_id", "upto_message_id")),
+        ("ix_news_item_created_at", "news_item", ("created_at",)),
+        ("ix_podcast_created_at", "podcast", ("created_at",)),
+        ("ix_music_item_created_at", "music_item", ("created_at",)),
+        ("ix_telemetry_data_timestamp", "telemetry_data", ("timestamp",)),
+    ])
+
+
+def m004_memory_fts(conn):
+    """Índice FTS5 de recuerdos (se omite si SQLite no trae FTS5)."""
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_memory_fts'"
+    ).first()
+    try:
+        for stmt in FTS_SCHEMA:
+            conn.exec_driver_sql(stmt)
+    except OperationalError as e:
+        print(f"⚠️ FTS5 no disponible, se omite el índice de recuerdos: {e}")
+        return
+    if not exists:
+        conn.exec_driver_sql("INSERT INTO user_memory_fts(user_memory_fts) VALUES ('rebuild')")
+
+
+def m005_cache_generation(conn):
+    """Contadores de generación para las cachés en proceso (p. ej. configuración del sitio)."""
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS cache_generation (
+        name VARCHAR(50) NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY (name)
+    )""")
+
+
+def m006_news_summary(conn):
+    """Extracto y tiempo de lectura precalculados para los listados de noticias."""
+    _add_columns(conn, "news_item", [("excerpt", "VARCHAR(400)"), ("reading_time", "INTEGER")])
+    rows = conn.exec_driver_sql("SELECT id, content FROM news_item WHERE excerpt IS NULL").all()
+    for row_id, content in rows:
+        excerpt, minutes = news_summary(content)
+        conn.exec_driver_sql(
+            "UPDATE news_item SET excerpt = ?, reading_time = ? WHERE id = ?", (excerpt, minutes, row_id)
+        )
+
+
+def m007_telemetry_minute(conn):
+    """Agregados de telemetría por modelo y minuto."""
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS telemetry_minute (
+        id INTEGER NOT NULL,
+        model_name VARCHAR(100) NOT NULL,
+        minute DATETIME NOT NULL,
+        count INTEGER NOT NULL,
+        latency_p50 FLOAT,
+        latency_p95 FLOAT,
+        tokens_per_sec_mean FLOAT,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_telemetry_minute_model UNIQUE (model_name, minute)
+    )""")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_telemetry_minute_minute ON telemetry_minute (minute)")
+
+
+MIGRATIONS = [
+    (1, "baseline", m001_baseline),
+    (2, "prompt_version", m002_prompt_version),
+    (3, "hot_path_indexes", m003_hot_path_indexes),
+    (4, "memory_fts", m004_memory_fts),
+    (5, "cache_generation", m005_cache_generation),
+    (6, "news_summary", m006_news_summary),
+    (7, "telemetry_minute", m007_telemetry_minute),
+]
+
+SCHEMA_HEAD = MIGRATIONS[-1][0]
+
+
+def current_version(engine) -> int:
+    with engine.connect() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+        ).first()
+        if not exists:
+            return 0
+        return conn.exec_driver_sql("SELECT COALESCE(MAX(version), 0) FROM schema_version").scalar()
+
+
+def migrate(engine) -> list:
+    """Aplica las migraciones pendientes, cada una en su transacción. Devuelve las aplicadas."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(SCHEMA_VERSION_TABLE)
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        with engine.begin() as conn:
+            done = conn.exec_driver_sql("SELECT 1 FROM schema_version WHERE version = ?", (version,)).first()
+            if done:
+                continue
+            fn(conn)
+            conn.exec_driver_sql(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, datetime.utcnow().isoformat(sep=" ")),
+            )
+        applied.append(f"{version:03d}_{name}")
+    return applied
+
+
+def check_schema(engine):
+    """Lanza SchemaOutdated si la BD no está en la última versión del esquema."""
+    version = current_version(engine)
+    if version < SCHEMA_HEAD:
+        raise SchemaOutdated(
+            f"Esquema de BD en versión {version}, se requiere {SCHEMA_HEAD}. Ejecuta: python migrate_db.py"
+        )
+    return version
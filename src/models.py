@@ -18,6 +18,7 @@ class User(UserMixin, db.Model):
     response_style = db.Column(db.String(20), default="default")  # default, conciso, socratico, formal
     custom_instructions = db.Column(db.Text, nullable=True)
     enable_memory = db.Column(db.Boolean, default=True)
+    prompt_version = db.Column(db.Integer, default=0)  # Bumped on settings/memory changes; keys the compiled-prompt cache
 
 class SiteConfig(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -36,7 +37,7 @@ class Podcast(db.Model):
     description = db.Column(db.Text, nullable=True)
     audio_filename = db.Column(db.String(255), nullable=False)
     image_filename = db.Column(db.String(255), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class MusicItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -44,17 +45,20 @@ class MusicItem(db.Model):
     artist = db.Column(db.String(100), nullable=True)
     filename = db.Column(db.String(255), nullable=False)
     genre = db.Column(db.String(50), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class ChatSession(db.Model):
     """Groups messages into a single conversation thread."""
+    __table_args__ = (db.Index('ix_chat_session_user_created', 'user_id', 'created_at'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(200), default="Nueva Conversación")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     messages = db.relationship('ChatMessage', backref='session', lazy=True, cascade="all, delete-orphan")
+    summaries = db.relationship('SessionSummary', backref='session', lazy=True, cascade="all, delete-orphan")
 
 class ChatMessage(db.Model):
+    __table_args__ = (db.Index('ix_chat_message_session_ts', 'session_id', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     session_id = db.Column(db.Integer, db.ForeignKey('chat_session.id'), nullable=True) # Temporarily nullable for migration
@@ -62,8 +66,19 @@ class ChatMessage(db.Model):
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+class SessionSummary(db.Model):
+    """Rolling summary checkpoint of a chat thread up to a given message."""
+    __table_args__ = (db.Index('ix_session_summary_session_upto', 'session_id', 'upto_message_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('chat_session.id'), nullable=False)
+    upto_message_id = db.Column(db.Integer, nullable=False)  # Last ChatMessage.id folded into the summary
+    summary = db.Column(db.Text, nullable=False)
+    token_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class UserMemory(db.Model):
     """Stored 'recuerdos' (facts) from conversations."""
+    __table_args__ = (db.Index('ix_user_memory_user_active', 'user_id', 'is_active'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     fact = db.Column(db.Text, nullable=False)
@@ -76,6 +91,11 @@ class AIConfig(db.Model):
     key = db.Column(db.String(100), unique=True, nullable=False)
     value = db.Column(db.Text, nullable=True)
 
+class CacheGeneration(db.Model):
+    """Counter bumped on writes so every worker can revalidate its in-process caches cheaply."""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
 class GalleryItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=True)
@@ -87,8 +107,11 @@ class NewsItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
+    # Precomputed for listings (see news.py) so they never load `content`
+    excerpt = db.Column(db.String(400), nullable=True)
+    reading_time = db.Column(db.Integer, nullable=True)
     image_filename = db.Column(db.String(255), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class TelemetryData(db.Model):
     """Anonymous performance metrics for model evolution."""
@@ -96,7 +119,18 @@ class TelemetryData(db.Model):
     model_name = db.Column(db.String(100))
     latency_ms = db.Column(db.Integer)
     tokens_per_sec = db.Column(db.Float)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class TelemetryMinute(db.Model):
+    """Per-model, per-minute rollup of TelemetryData (see telemetry.py)."""
+    __table_args__ = (db.UniqueConstraint('model_name', 'minute', name='uq_telemetry_minute_model'),)
+    id = db.Column(db.Integer, primary_key=True)
+    model_name = db.Column(db.String(100), nullable=False)
+    minute = db.Column(db.DateTime, nullable=False, index=True)
+    count = db.Column(db.Integer, nullable=False)
+    latency_p50 = db.Column(db.Float)
+    latency_p95 = db.Column(db.Float)
+    tokens_per_sec_mean = db.Column(db.Float)
 
 class ModelPackage(db.Model):
     """External models available for download and local install."""
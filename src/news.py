@@ -0,0 +1,23 @@
+import os
+import math
+
+from markupsafe import Markup
+
+NEWS_EXCERPT_CHARS = int(os.getenv("NEWS_EXCERPT_CHARS", "280"))
+NEWS_WORDS_PER_MINUTE = int(os.getenv("NEWS_WORDS_PER_MINUTE", "200"))
+
+
+def news_summary(content_html: str) -> tuple:
+    """(excerpt, reading_time en minutos) de una crónica en HTML, para los listados."""
+    text = Markup(content_html or "").striptags()
+    minutes = max(1, math.ceil(len(text.split()) / NEWS_WORDS_PER_MINUTE))
+    if len(text) > NEWS_EXCERPT_CHARS:
+        # Corta en el último espacio para no partir palabras
+        text = text[:NEWS_EXCERPT_CHARS].rsplit(" ", 1)[0].rstrip(" ,;:.") + "…"
+    return text, minutes
+
+
+def fill_news_summary(item):
+    """Rellena `excerpt` y `reading_time` de un NewsItem a partir de su `content`."""
+    item.excerpt, item.reading_time = news_summary(item.content)
+    return item
@@ -0,0 +1,148 @@
+import os
+import time
+import hashlib
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+from flask import request, session, make_response
+from flask_login import current_user
+from sqlalchemy import text
+from werkzeug.http import http_date
+
+from models import db
+from config_cache import SITE_CONFIG_GENERATION
+
+PAGE_CACHE = os.getenv("PAGE_CACHE", "true").lower() == "true"
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "256"))
+# Red de seguridad para cambios hechos fuera de la app (scripts, recreate_db.py)
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "300"))
+# Segundos entre lecturas de los contadores de generación (0 = en cada petición)
+PAGE_CACHE_CHECK_INTERVAL = float(os.getenv("PAGE_CACHE_CHECK_INTERVAL", "1.0"))
+
+
+class _Page:
+    __slots__ = ("body", "mimetype", "etag", "last_modified", "generations", "created")
+
+    def __init__(self, body, mimetype, generations):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = time.time()
+        self.generations = generations
+        self.created = time.monotonic()
+
+
+class PageCache:
+    """Caché en proceso de páginas públicas renderizadas para visitantes anónimos.
+
+    Cada página se guarda con la generación de sus etiquetas ("news",
+    "music"...) y de la configuración del sitio; las rutas de escritura
+    incrementan el contador en la BD con `bump_generation`, así que la
+    invalidación alcanza a todos los workers. Sirve ETag/Last-Modified y
+    responde 304 a las revalidaciones.
+    """
+
+    def __init__(self, enabled: bool = PAGE_CACHE, max_entries: int = PAGE_CACHE_MAX_ENTRIES,
+                 ttl: int = PAGE_CACHE_TTL, check_interval: float = PAGE_CACHE_CHECK_INTERVAL):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations = None
+        self._checked_at = 0.0
+        self._counts = {"hits": 0, "not_modified": 0, "misses": 0, "stale": 0, "bypassed": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def generations(self) -> dict:
+        """{etiqueta: generación}, releído de la BD como mucho cada `check_interval` s."""
+        now = time.monotonic()
+        with self._lock:
+            if self._generations is not None and now - self._checked_at < self.check_interval:
+                return self._generations
+        rows = db.session.execute(text("SELECT name, value FROM cache_generation")).all()
+        generations = {name: value for name, value in rows}
+        with self._lock:
+            self._generations, self._checked_at = generations, now
+        return generations
+
+    def invalidate(self):
+        """Fuerza la relectura de las generaciones (tras un cambio en este worker)."""
+        with self._lock:
+            self._generations = None
+
+    def _cacheable(self) -> bool:
+        if not self.enabled or request.method != "GET":
+            return False
+        # Usuarios con sesión o con mensajes flash pendientes ven una página distinta
+        return not current_user.is_authenticated and "_flashes" not in session
+
+    def _respond(self, page: _Page):
+        response = make_response(page.body)
+        response.mimetype = page.mimetype
+        response.set_etag(page.etag)
+        response.headers["Last-Modified"] = http_date(page.last_modified)
+        response.headers["Cache-Control"] = "no-cache"
+        # La misma URL con cookie de sesión es otra página
+        response.vary.add("Cookie")
+        return response.make_conditional(request)
+
+    def cached(self, *tags):
+        """Decorador de vista: cachea la respuesta anónima por ruta + query string."""
+        tags = tuple(tags) + (SITE_CONFIG_GENERATION,)
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self._cacheable():
+                    self._count("bypassed")
+                    return view(*args, **kwargs)
+
+                key = (request.path, tuple(sorted(request.args.items(multi=True))))
+                current = self.generations()
+                stamp = tuple(current.get(t, 0) for t in tags)
+                with self._lock:
+                    page = self._entries.get(key)
+                    if page and page.generations == stamp and time.monotonic() - page.created < self.ttl:
+                        self._entries.move_to_end(key)
+                    else:
+                        if page:
+                            self._counts["stale"] += 1
+                        page = None
+                if page:
+                    response = self._respond(page)
+                    self._count("not_modified" if response.status_code == 304 else "hits")
+                    return response
+
+                self._count("misses")
+                response = make_response(view(*args, **kwargs))
+                # Solo respuestas completas que no tocan la sesión (no emitirán Set-Cookie)
+                if response.status_code != 200 or response.direct_passthrough or session.modified:
+                    return response
+                page = _Page(response.get_data(), response.mimetype, stamp)
+                with self._lock:
+                    self._entries[key] = page
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                return self._respond(page)
+            return wrapper
+        return decorator
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self._counts)
+            c["entries"] = len(self._entries)
+        served = c["hits"] + c["not_modified"] + c["misses"]
+        c.update({
+            "enabled": self.enabled,
+            "hit_rate": round((c["hits"] + c["not_modified"]) / served, 3) if served else 0.0,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        })
+        return c
@@ -0,0 +1,49 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+class BadCursor(ValueError):
+    """Cursor de paginación ilegible o manipulado."""
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    """Cursor opaco (base64url) con la clave de ordenación (ts, id) de la última fila servida."""
+    raw = f"{ts.isoformat()}|{row_id}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        ts, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise BadCursor(f"Cursor inválido: {cursor!r}") from e
+
+
+def keyset_before(ts_col, id_col, cursor: str):
+    """Filtro para la página siguiente en orden (ts, id) descendente.
+
+    Se expande a OR/AND en vez de comparar tuplas para que SQLite use el
+    índice compuesto (x, ts) con cualquier versión.
+    """
+    ts, row_id = decode_cursor(cursor)
+    return or_(ts_col < ts, and_(ts_col == ts, id_col < row_id))
+
+
+def parse_limit(value, default: int, maximum: int) -> int:
+    try:
+        limit = int(value) if value is not None else default
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def parse_fields(value, allowed, default):
+    """Lista de campos pedidos en `?fields=a,b` (solo los permitidos, en orden canónico)."""
+    if not value:
+        return list(default)
+    wanted = {f.strip() for f in value.split(",")}
+    return [f for f in allowed if f in wanted] or list(default)
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "1024"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS compiled_prompts (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class PromptCache:
+    """Caché LRU de prompts compilados por usuario, validada por un sello de versión.
+
+    La entrada solo sirve si `version` coincide con `User.prompt_version`, que se
+    incrementa al cambiar ajustes o recuerdos; no hace falta invalidar a mano.
+    Con `store_path`, las entradas se comparten entre workers vía SQLite.
+    """
+
+    def __init__(self, max_entries: int = PROMPT_CACHE_SIZE, store_path=None):
+        self.max_entries = max_entries
+        self.store_path = str(store_path) if store_path else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counts = {"hits": 0, "store_hits": 0, "misses": 0}
+        if self.store_path:
+            conn = self._connect()
+            conn.executescript(SCHEMA)
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.store_path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _remember(self, user_id, version, data):
+        with self._lock:
+            self._entries[user_id] = (version, data)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(user_id)
+                self._counts["hits"] += 1
+                return entry[1]
+
+        if self.store_path:
+            try:
+                row = self._conn().execute(
+                    "SELECT data FROM compiled_prompts WHERE user_id = ? AND version = ?", (user_id, version)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"⚠️ Prompt cache store: {e}")
+                row = None
+            if row:
+                data = json.loads(row[0])
+                self._remember(user_id, version, data)
+                with self._lock:
+                    self._counts["store_hits"] += 1
+                return data
+
+        with self._lock:
+            self._counts["misses"] += 1
+        return None
+
+    def put(self, user_id, version, data: dict):
+        """`data` debe ser serializable a JSON si hay backing store."""
+        self._remember(user_id, version, data)
+        if self.store_path:
+            try:
+                self._conn().execute(
+                    "INSERT OR REPLACE INTO compiled_prompts (user_id, version, data, updated_at) VALUES (?, ?, ?, ?)",
+                    (user_id, version, json.dumps(data), time.time()),
+                )
+            except sqlite3.Error as e:
+                print(f"⚠️ Prompt cache store: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self._counts)
+            size = len(self._entries)
+        total = sum(c.values()) or 1
+        c.update({
+            "entries": size,
+            "max_entries": self.max_entries,
+            "shared_store": bool(self.store_path),
+            "hit_rate": round((c["hits"] + c["store_hits"]) / total, 3),
+        })
+        return c
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "false").lower() == "true"
+# Por defecto solo se cachean llamadas no personalizadas y no streaming
+RESPONSE_CACHE_PERSONALIZED = os.getenv("RESPONSE_CACHE_PERSONALIZED", "false").lower() == "true"
+RESPONSE_CACHE_STREAM = os.getenv("RESPONSE_CACHE_STREAM", "false").lower() == "true"
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_llm_responses_last_used ON llm_responses (last_used);
+"""
+
+
+def cache_key(payload: dict) -> str:
+    """Hash normalizado de modelo + mensajes + temperatura (espacios colapsados)."""
+    normalized = {
+        "model": payload.get("model"),
+        "temperature": round(float(payload.get("temperature", 0.0)), 2),
+        "max_tokens": payload.get("max_tokens"),
+        "messages": [[m.get("role"), " ".join(str(m.get("content", "")).split())] for m in payload.get("messages", [])],
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Caché exacta de respuestas del LLM, compartida entre workers vía SQLite.
+
+    TTL + desalojo LRU por tamaño. Desactivada por defecto (RESPONSE_CACHE=true
+    para activarla); las sesiones personalizadas o streaming se saltan salvo
+    que se habiliten explícitamente.
+    """
+
+    def __init__(self, path, enabled: bool = RESPONSE_CACHE, ttl: int = RESPONSE_CACHE_TTL,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 personalized: bool = RESPONSE_CACHE_PERSONALIZED, stream: bool = RESPONSE_CACHE_STREAM):
+        self.path = str(path)
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.allow_personalized = personalized
+        self.allow_stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+        if self.enabled:
+            conn = self._connect()
+            conn.executescript(SCHEMA)
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._counts[key] += n
+
+    def applies(self, personalized: bool = False, stream: bool = False) -> bool:
+        ok = self.enabled and (self.allow_personalized or not personalized) and (self.allow_stream or not stream)
+        if self.enabled and not ok:
+            self._count("bypassed")
+        return ok
+
+    def get(self, payload: dict):
+        key = cache_key(payload)
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                conn.execute("UPDATE llm_responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+                self._count("hits")
+                return row[0]
+            if row:
+                conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"⚠️ Response cache: {e}")
+        self._count("misses")
+        return None
+
+    def put(self, payload: dict, response: str):
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, model, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (cache_key(payload), payload.get("model", ""), response, now, now),
+            )
+            self._count("stores")
+            # Desalojo amortizado: solo cada ~50 escrituras
+            if self._counts["stores"] % 50 == 0:
+                self.evict()
+        except sqlite3.Error as e:
+            print(f"⚠️ Response cache: {e}")
+
+    def evict(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl,))
+        excess = conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM llm_responses WHERE key IN (SELECT key FROM llm_responses ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self._count("evictions", excess)
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self._counts)
+        lookups = c["hits"] + c["misses"]
+        c.update({
+            "enabled": self.enabled,
+            "hit_rate": round(c["hits"] / lookups, 3) if lookups else 0.0,
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+        })
+        return c
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import resource
+import threading
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL", "base")
+PIPER_VOICE_PATH = os.getenv("PIPER_VOICE", str(PROJECT_ROOT / "piper" / "es_ES-davefx-medium.onnx"))
+# Modelos a cargar al importar (p. ej. "whisper,piper"). Con `gunicorn --preload`
+# se cargan una vez en el master y los workers los comparten copy-on-write.
+SPEECH_PRELOAD = [m.strip() for m in os.getenv("SPEECH_PRELOAD", "").split(",") if m.strip()]
+
+
+def rss_mb() -> float:
+    """Memoria residente actual del proceso (MB)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        # Sin /proc: pico de RSS (KB en Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def voice_sample_rate(voice_path: str = PIPER_VOICE_PATH) -> int:
+    """Sample rate de la voz Piper según su .onnx.json (sin cargar el modelo)."""
+    try:
+        with open(f"{voice_path}.json", encoding="utf-8") as f:
+            return int(json.load(f)["audio"]["sample_rate"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 22050
+
+
+def _load_whisper(size):
+    import whisper
+    return whisper.load_model(size)
+
+
+def _load_piper(path):
+    from piper import PiperVoice
+    return PiperVoice.load(str(path))
+
+
+class SpeechModels:
+    """Registro único de modelos de voz (Whisper STT, Piper TTS) por proceso.
+
+    Cada modelo se carga una sola vez, en el primer uso y bajo lock, aunque lo
+    pidan varios hilos a la vez. Anota el tiempo de carga y el RSS añadido.
+    """
+
+    def __init__(self, whisper_size: str = WHISPER_MODEL_SIZE, piper_voice: str = PIPER_VOICE_PATH):
+        self._loaders = {
+            "whisper": (_load_whisper, whisper_size),
+            "piper": (_load_piper, piper_voice),
+        }
+        self._models = {}
+        self._info = {}
+        self._locks = {name: threading.Lock() for name in self._loaders}
+
+    def get(self, name: str):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                loader, arg = self._loaders[name]
+                rss_before, started = rss_mb(), time.perf_counter()
+                model = loader(arg)
+                self._info[name] = {
+                    "model": str(arg),
+                    "load_seconds": round(time.perf_counter() - started, 2),
+                    "rss_added_mb": round(rss_mb() - rss_before, 1),
+                    "pid": os.getpid(),
+                }
+                self._models[name] = model
+                print(f"🎙️ Modelo {name} ({arg}) cargado en {self._info[name]['load_seconds']}s.")
+        return model
+
+    def whisper(self):
+        return self.get("whisper")
+
+    def piper(self):
+        return self.get("piper")
+
+    def preload(self, names=None):
+        for name in names or self._loaders:
+            self.get(name)
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "rss_mb": round(rss_mb(), 1),
+            "models": {
+                name: {"loaded": name in self._models, **self._info.get(name, {"model": str(arg)})}
+                for name, (_, arg) in self._loaders.items()
+            },
+        }
+
+
+speech_models = SpeechModels()
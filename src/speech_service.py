@@ -0,0 +1,249 @@
+"""Servicio local de voz (STT/TTS) fuera de los workers web.
+
+    SPEECH_WORKERS=2 python src/speech_service.py
+
+Los workers web se conectan por un socket Unix (SPEECH_SERVICE_SOCKET) y
+envían trabajos; un pool de procesos con Whisper/Piper cargados una vez por
+proceso los ejecuta, con los hilos de torch repartidos entre los núcleos.
+"""
+import os
+import sys
+import time
+import secrets
+import threading
+import multiprocessing
+from pathlib import Path
+from multiprocessing.connection import Listener, Client
+from concurrent.futures import ProcessPoolExecutor
+
+SPEECH_SERVICE_SOCKET = os.getenv("SPEECH_SERVICE_SOCKET", "")
+# Clave compartida servidor/clientes. Sin SPEECH_SERVICE_AUTHKEY, el servicio
+# genera una aleatoria en SPEECH_SERVICE_AUTHKEY_FILE (0600, por defecto
+# speech.key junto al socket) y los workers web la leen de ahí.
+SPEECH_SERVICE_AUTHKEY = os.getenv("SPEECH_SERVICE_AUTHKEY", "")
+SPEECH_SERVICE_AUTHKEY_FILE = os.getenv("SPEECH_SERVICE_AUTHKEY_FILE", "")
+# Socket y clave por defecto: directorio privado, fuera de tmp_audio (que se sirve por /audio)
+DEFAULT_RUN_DIR = Path(__file__).resolve().parent.parent / "run"
+SPEECH_SERVICE_TIMEOUT = float(os.getenv("SPEECH_SERVICE_TIMEOUT", "120"))
+# Procesos de cómputo; cada uno usa cpu_count // SPEECH_WORKERS hilos de torch
+SPEECH_WORKERS = int(os.getenv("SPEECH_WORKERS", "1"))
+
+OPS = ("stt", "tts")
+
+
+class SpeechUnavailable(Exception):
+    """El servicio de voz no responde o falló el trabajo."""
+
+
+def authkey_path(address: str) -> Path:
+    return Path(SPEECH_SERVICE_AUTHKEY_FILE or Path(address).with_name("speech.key"))
+
+
+def load_authkey(address: str, create: bool = False) -> bytes:
+    """Clave del servicio: de SPEECH_SERVICE_AUTHKEY o del fichero de clave.
+
+    Con `create` (el servidor) se genera el fichero si no existe, con permisos 0600
+    desde su creación. Lanza SpeechUnavailable si no hay clave.
+    """
+    if SPEECH_SERVICE_AUTHKEY:
+        return SPEECH_SERVICE_AUTHKEY.encode()
+    path = authkey_path(address)
+    try:
+        return bytes.fromhex(path.read_text().strip())
+    except FileNotFoundError:
+        if not create:
+            raise SpeechUnavailable(f"Sin clave del servicio de voz: define SPEECH_SERVICE_AUTHKEY o crea {path}")
+    except (OSError, ValueError) as e:
+        raise SpeechUnavailable(f"Clave del servicio de voz ilegible en {path}: {e}") from e
+    key = secrets.token_bytes(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(key.hex())
+    print(f"🔑 Clave del servicio de voz generada en {path}")
+    return key
+
+
+# =========================
+# Procesos de cómputo
+# =========================
+def _init_worker(threads: int):
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from speech_models import speech_models
+    speech_models.preload()
+
+
+def _run_job(op: str, arg: str, submitted: float):
+    from voice import transcribe_audio, synthesize_wav
+    started = time.time()
+    # Audio de entrada y WAV de salida viajan como bytes por el socket, sin ficheros
+    result = transcribe_audio(arg) if op == "stt" else bytes(synthesize_wav(arg))
+    return result, (started - submitted) * 1000, (time.time() - started) * 1000
+
+
+# =========================
+# Servidor
+# =========================
+class SpeechService:
+    """Acepta conexiones locales y reparte los trabajos en el pool de procesos."""
+
+    def __init__(self, address: str, workers: int = SPEECH_WORKERS):
+        self.address = address
+        self.workers = workers
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(threads,),
+        )
+        self._lock = threading.Lock()
+        self._stats = {op: {"jobs": 0, "errors": 0, "queue_ms": 0.0, "compute_ms": 0.0, "max_queue_ms": 0.0}
+                       for op in OPS}
+        self._in_flight = 0
+
+    def _record(self, op, queue_ms=None, compute_ms=None, error=False):
+        with self._lock:
+            s = self._stats[op]
+            if error:
+                s["errors"] += 1
+                return
+            s["jobs"] += 1
+            s["queue_ms"] += queue_ms
+            s["compute_ms"] += compute_ms
+            s["max_queue_ms"] = max(s["max_queue_ms"], queue_ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {"workers": self.workers, "in_flight": self._in_flight}
+            for op, s in self._stats.items():
+                jobs = s["jobs"] or 1
+                out[op] = {
+                    "jobs": s["jobs"],
+                    "errors": s["errors"],
+                    "avg_queue_ms": round(s["queue_ms"] / jobs, 1),
+                    "max_queue_ms": round(s["max_queue_ms"], 1),
+                    "avg_compute_ms": round(s["compute_ms"] / jobs, 1),
+                }
+        return out
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                op = request.get("op")
+                if op == "stats":
+                    conn.send({"ok": True, "result": self.stats()})
+                    continue
+                if op not in OPS:
+                    conn.send({"ok": False, "error": f"Operación desconocida: {op}"})
+                    continue
+                with self._lock:
+                    self._in_flight += 1
+                try:
+                    result, queue_ms, compute_ms = self.pool.submit(
+                        _run_job, op, request["arg"], request["submitted"]
+                    ).result()
+                    self._record(op, queue_ms, compute_ms)
+                    reply = {"ok": True, "result": result, "queue_ms": queue_ms, "compute_ms": compute_ms}
+                except Exception as e:
+                    self._record(op, error=True)
+                    reply = {"ok": False, "error": str(e)}
+                finally:
+                    with self._lock:
+                        self._in_flight -= 1
+                try:
+                    conn.send(reply)
+                except OSError:
+                    return
+
+    def serve_forever(self):
+        run_dir = Path(self.address).parent
+        if not run_dir.exists():
+            run_dir.mkdir(mode=0o700, parents=True)
+        authkey = load_authkey(self.address, create=True)
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        # El socket nace ya con 0600: sin ventana entre bind() y un chmod posterior
+        old_umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, family="AF_UNIX", authkey=authkey)
+        finally:
+            os.umask(old_umask)
+        with listener:
+            print(f"🎙️ Servicio de voz en {self.address} ({self.workers} procesos)")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # Handshake fallido (authkey incorrecta, cliente que se va...)
+                    print(f"⚠️ Conexión rechazada: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+# =========================
+# Cliente (workers web)
+# =========================
+class SpeechServiceClient:
+    """Cliente del servicio de voz: una conexión persistente por hilo."""
+
+    def __init__(self, address: str, timeout: float = SPEECH_SERVICE_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+        self._authkey = None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            if self._authkey is None:
+                # Se lee en la primera conexión: el servicio puede arrancar después que la web
+                self._authkey = load_authkey(self.address)
+            try:
+                conn = Client(self.address, family="AF_UNIX", authkey=self._authkey)
+            except (OSError, multiprocessing.AuthenticationError) as e:
+                # Clave rotada (servicio reinstalado): se vuelve a leer en el siguiente intento
+                self._authkey = None
+                raise SpeechUnavailable(f"Servicio de voz no disponible en {self.address}: {e}") from e
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _call(self, request: dict):
+        conn = self._conn()
+        try:
+            conn.send(request)
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"sin respuesta en {self.timeout}s")
+            reply = conn.recv()
+        except (OSError, EOFError, TimeoutError) as e:
+            # La conexión queda inservible (o desincronizada): se reabre en la siguiente llamada
+            conn.close()
+            self._local.conn = None
+            raise SpeechUnavailable(f"Servicio de voz: {e}") from e
+        if not reply["ok"]:
+            raise SpeechUnavailable(reply["error"])
+        return reply["result"]
+
+    def transcribe(self, audio) -> str:
+        """`audio`: bytes del fichero subido (o una ruta local al servicio)."""
+        return self._call({"op": "stt", "arg": audio, "submitted": time.time()})
+
+    def synthesize(self, text: str) -> bytes:
+        """WAV del texto."""
+        return self._call({"op": "tts", "arg": text, "submitted": time.time()})
+
+    def stats(self) -> dict:
+        return self._call({"op": "stats"})
+
+
+if __name__ == "__main__":
+    address = SPEECH_SERVICE_SOCKET or str(DEFAULT_RUN_DIR / "speech.sock")
+    try:
+        SpeechService(address).serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
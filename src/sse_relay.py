@@ -0,0 +1,61 @@
+import json
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+DONE_FRAME = b'data: {"done": true}\n\n'
+
+
+def sse_frame(data: dict) -> bytes:
+    # ensure_ascii: el cliente decodifica chunk a chunk sin TextDecoder en modo stream
+    return b"data: " + json.dumps(data).encode("ascii") + b"\n\n"
+
+
+class SSERelay:
+    """Reenvía los deltas de LM Studio al cliente con un solo parse por evento.
+
+    El texto completo se acumula en una lista (sin concatenaciones cuadráticas)
+    y se entrega a la persistencia con `text()`; no se reenvía al cliente.
+    `on_content` recibe cada delta según llega (p. ej. para la voz en streaming).
+    """
+
+    def __init__(self, on_content=None):
+        self._parts = []
+        self.completed = False
+        self.on_content = on_content
+
+    def feed(self, line: bytes):
+        """Convierte una línea SSE upstream en el frame para el cliente (o None)."""
+        line = line.strip()
+        if not line.startswith(b"data: "):
+            return None
+        data = line[6:]
+        if data == b"[DONE]":
+            return None
+        try:
+            content = _loads(data)["choices"][0]["delta"].get("content")
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            return None
+        if not content:
+            return None
+        self._parts.append(content)
+        if self.on_content:
+            self.on_content(content)
+        return sse_frame({"content": content})
+
+    def replay(self, text: str) -> bytes:
+        """Frame único con una respuesta ya conocida (p. ej. desde caché)."""
+        self._parts.append(text)
+        if self.on_content:
+            self.on_content(text)
+        return sse_frame({"content": text})
+
+    def done(self) -> bytes:
+        self.completed = True
+        return DONE_FRAME
+
+    def text(self) -> str:
+        return "".join(self._parts)
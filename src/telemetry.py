@@ -0,0 +1,165 @@
+import os
+import math
+import atexit
+import threading
+from collections import deque, defaultdict
+from datetime import datetime, timedelta
+
+from models import db, TelemetryData, TelemetryMinute
+
+TELEMETRY_BUFFER_SIZE = int(os.getenv("TELEMETRY_BUFFER_SIZE", "10000"))
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "5"))
+# Eventos aceptados por POST
+TELEMETRY_MAX_BATCH = int(os.getenv("TELEMETRY_MAX_BATCH", "500"))
+TELEMETRY_ROLLUP_INTERVAL = int(os.getenv("TELEMETRY_ROLLUP_INTERVAL", "60"))
+# Minutos ya cerrados que se recalculan en cada rollup (eventos que llegan tarde)
+TELEMETRY_ROLLUP_LOOKBACK_MINUTES = int(os.getenv("TELEMETRY_ROLLUP_LOOKBACK_MINUTES", "10"))
+TELEMETRY_RAW_RETENTION_HOURS = int(os.getenv("TELEMETRY_RAW_RETENTION_HOURS", "24"))
+TELEMETRY_AGG_RETENTION_DAYS = int(os.getenv("TELEMETRY_AGG_RETENTION_DAYS", "90"))
+
+
+def parse_event(data) -> dict:
+    """Normaliza un evento del cliente; ValueError si no es válido."""
+    if not isinstance(data, dict):
+        raise ValueError("evento no es un objeto")
+    latency = float(data.get("latency_ms", 0))
+    tps = float(data.get("tokens_per_sec", 0.0))
+    if not (math.isfinite(latency) and math.isfinite(tps)) or latency < 0 or tps < 0:
+        raise ValueError("valores fuera de rango")
+    return {
+        "model_name": str(data.get("model", "unknown"))[:100],
+        "latency_ms": int(latency),
+        "tokens_per_sec": tps,
+    }
+
+
+def percentile(sorted_values, p: float):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return float(sorted_values[rank - 1])
+
+
+class TelemetryBuffer:
+    """Buffer circular en memoria (por worker) con volcado periódico en bloque.
+
+    Si el buffer se llena se descartan los eventos más antiguos (se cuentan
+    en `dropped`): la telemetría nunca frena al chat.
+    """
+
+    def __init__(self, app, size: int = TELEMETRY_BUFFER_SIZE, flush_interval: float = TELEMETRY_FLUSH_INTERVAL):
+        self.app = app
+        self.flush_interval = flush_interval
+        self._events = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started_pid = None
+        self._counts = {"accepted": 0, "dropped": 0, "flushed": 0, "flushes": 0, "errors": 0}
+        atexit.register(self.flush)
+
+    def add(self, events: list):
+        now = datetime.utcnow()
+        self._ensure_started()
+        with self._lock:
+            overflow = max(0, len(self._events) + len(events) - self._events.maxlen)
+            for event in events:
+                event["timestamp"] = now
+                self._events.append(event)
+            self._counts["accepted"] += len(events)
+            self._counts["dropped"] += overflow
+            if len(self._events) >= self._events.maxlen // 2:
+                self._wakeup.set()
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._lock:
+            if self._started_pid == pid:
+                return
+            self._events.clear()
+            threading.Thread(target=self._loop, name="ie-telemetry", daemon=True).start()
+            self._started_pid = pid
+
+    def _loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Inserta en bloque (un executemany, un commit) lo acumulado."""
+        with self._lock:
+            batch = list(self._events)
+            self._events.clear()
+        if not batch:
+            return 0
+        try:
+            with self.app.app_context():
+                db.session.execute(TelemetryData.__table__.insert(), batch)
+                db.session.commit()
+        except Exception as e:
+            with self._lock:
+                self._counts["errors"] += 1
+                self._counts["dropped"] += len(batch)
+            print(f"⚠️ Telemetría: no se pudo volcar el buffer ({len(batch)} eventos): {e}")
+            return 0
+        with self._lock:
+            self._counts["flushed"] += len(batch)
+            self._counts["flushes"] += 1
+        return len(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self._counts)
+            c["buffered"] = len(self._events)
+        c["capacity"] = self._events.maxlen
+        return c
+
+
+def rollup_telemetry(now: datetime = None) -> dict:
+    """Recalcula los agregados por modelo y minuto de la ventana reciente y aplica la retención.
+
+    Solo se agregan minutos cerrados; los de los últimos
+    TELEMETRY_ROLLUP_LOOKBACK_MINUTES se recalculan para recoger eventos
+    tardíos. Requiere app context.
+    """
+    now = now or datetime.utcnow()
+    end = now.replace(second=0, microsecond=0)
+    start = end - timedelta(minutes=TELEMETRY_ROLLUP_LOOKBACK_MINUTES)
+
+    rows = db.session.query(
+        TelemetryData.model_name, TelemetryData.timestamp, TelemetryData.latency_ms, TelemetryData.tokens_per_sec
+    ).filter(TelemetryData.timestamp >= start, TelemetryData.timestamp < end).all()
+
+    buckets = defaultdict(lambda: ([], []))
+    for model_name, ts, latency, tps in rows:
+        latencies, rates = buckets[(model_name or "unknown", ts.replace(second=0, microsecond=0))]
+        latencies.append(latency or 0)
+        rates.append(tps or 0.0)
+
+    TelemetryMinute.query.filter(TelemetryMinute.minute >= start, TelemetryMinute.minute < end) \
+        .delete(synchronize_session=False)
+    aggregates = []
+    for (model_name, minute), (latencies, rates) in buckets.items():
+        latencies.sort()
+        aggregates.append({
+            "model_name": model_name,
+            "minute": minute,
+            "count": len(latencies),
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "tokens_per_sec_mean": sum(rates) / len(rates),
+        })
+    if aggregates:
+        db.session.execute(TelemetryMinute.__table__.insert(), aggregates)
+
+    raw_deleted = TelemetryData.query.filter(
+        TelemetryData.timestamp < now - timedelta(hours=TELEMETRY_RAW_RETENTION_HOURS)
+    ).delete(synchronize_session=False)
+    agg_deleted = TelemetryMinute.query.filter(
+        TelemetryMinute.minute < now - timedelta(days=TELEMETRY_AGG_RETENTION_DAYS)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return {"minutes": len(aggregates), "raw_deleted": raw_deleted, "aggregates_deleted": agg_deleted}
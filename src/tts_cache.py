@@ -0,0 +1,169 @@
+import os
+import re
+import hashlib
+import threading
+import unicodedata
+from pathlib import Path
+from collections import OrderedDict
+
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", "32"))
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", "256"))
+# Solo frases cortas (saludos, errores, frases del stream): las respuestas largas casi nunca se repiten
+TTS_CACHE_MAX_CHARS = int(os.getenv("TTS_CACHE_MAX_CHARS", "300"))
+
+_KEY_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TTSCache:
+    """Caché de audio TTS direccionada por contenido: hash(texto normalizado, voz, sample rate).
+
+    Dos niveles: LRU en memoria (por worker) y WAVs en disco bajo
+    `disk_dir`, compartidos entre workers y limitados en tamaño (se borran los
+    de mtime más antiguo; cada acierto renueva el mtime). Como la clave es el
+    hash, el audio es inmutable y sirve de ETag fuerte.
+    """
+
+    def __init__(self, disk_dir, voice: str, sample_rate: int,
+                 memory_mb: float = TTS_CACHE_MEMORY_MB, disk_mb: float = TTS_CACHE_DISK_MB,
+                 max_chars: int = TTS_CACHE_MAX_CHARS):
+        self.disk_dir = Path(disk_dir)
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self.voice = voice
+        self.sample_rate = sample_rate
+        self.memory_limit = int(memory_mb * 2**20)
+        self.disk_limit = int(disk_mb * 2**20)
+        self.max_chars = max_chars
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob("*.wav"))
+        self._lock = threading.Lock()
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "skipped": 0, "evicted_disk": 0}
+
+    def key(self, text: str) -> str:
+        raw = f"{self.voice}\0{self.sample_rate}\0{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def cacheable(self, text: str) -> bool:
+        return 0 < len(text.strip()) <= self.max_chars
+
+    @staticmethod
+    def url(key: str) -> str:
+        return f"/audio/tts/{key}.wav"
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.wav"
+
+    def get(self, key: str, count: bool = False):
+        """WAV de la clave (memoria, luego disco) o None."""
+        if not _KEY_RE.match(key):
+            return None
+        with self._lock:
+            wav = self._memory.get(key)
+            if wav is not None:
+                self._memory.move_to_end(key)
+                if count:
+                    self._counts["memory_hits"] += 1
+                return wav
+        path = self._path(key)
+        try:
+            wav = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            return None
+        self._remember(key, wav)
+        if count:
+            with self._lock:
+                self._counts["disk_hits"] += 1
+        return wav
+
+    def get_or_synthesize(self, text: str, synthesize):
+        """(clave, WAV): de la caché si la frase ya se sintetizó; si no, `synthesize(text)` y se guarda.
+
+        La clave es None si el texto no se cachea (vacío o demasiado largo) o si
+        el WAV no está en disco: solo el nivel de disco lo pueden servir todos
+        los workers, así que sin él no hay URL que anunciar.
+        """
+        if not self.cacheable(text):
+            with self._lock:
+                self._counts["skipped"] += 1
+            return None, synthesize(text)
+        key = self.key(text)
+        wav = self.get(key, count=True)
+        if wav is not None:
+            # Acierto en memoria cuyo fichero pudo podar otro worker
+            if not self._path(key).exists() and not self._store(key, wav):
+                return None, wav
+            return key, wav
+        with self._lock:
+            self._counts["misses"] += 1
+        wav = bytes(synthesize(text))
+        if not wav:
+            return None, wav
+        self._remember(key, wav)
+        return (key if self._store(key, wav) else None), wav
+
+    def _remember(self, key, wav):
+        with self._lock:
+            if key in self._memory or len(wav) > self.memory_limit:
+                return
+            self._memory[key] = wav
+            self._memory_bytes += len(wav)
+            while self._memory_bytes > self.memory_limit:
+                _, old = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old)
+
+    def _store(self, key, wav) -> bool:
+        """Escribe el WAV en el nivel de disco; False si no se pudo."""
+        path = self._path(key)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_bytes(wav)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ Caché TTS: no se pudo escribir {path.name}: {e}")
+            tmp.unlink(missing_ok=True)
+            return False
+        with self._lock:
+            self._disk_bytes += len(wav)
+            over = self._disk_bytes > self.disk_limit
+        if over:
+            self._prune()
+        return path.exists()
+
+    def _prune(self):
+        # Otros workers también escriben: se recuenta desde el disco
+        files = []
+        for p in self.disk_dir.glob("*.wav"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = int(self.disk_limit * 0.9)
+        evicted = 0
+        for _, size, p in files:
+            if total <= target:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._counts["evicted_disk"] += evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self._counts)
+            c["memory_entries"] = len(self._memory)
+            c["memory_mb"] = round(self._memory_bytes / 2**20, 2)
+            c["disk_mb"] = round(self._disk_bytes / 2**20, 2)
+        lookups = c["memory_hits"] + c["disk_hits"] + c["misses"]
+        c["hit_rate"] = round((c["memory_hits"] + c["disk_hits"]) / lookups, 3) if lookups else None
+        c.update({"voice": self.voice, "sample_rate": self.sample_rate})
+        return c
@@ -0,0 +1,126 @@
+import os
+import re
+import queue
+import base64
+import threading
+
+from sse_relay import SSERelay, sse_frame, DONE_FRAME
+
+# Frases más cortas se juntan con la siguiente (Piper entona mejor y hay menos frames)
+TTS_MIN_SENTENCE_CHARS = int(os.getenv("TTS_MIN_SENTENCE_CHARS", "20"))
+# Sin puntuación, se corta igualmente (en una coma o espacio) a partir de aquí
+TTS_MAX_SENTENCE_CHARS = int(os.getenv("TTS_MAX_SENTENCE_CHARS", "240"))
+
+# Fin de frase: puntuación seguida de espacio (no parte "3.5" ni "www.x.es") o salto de línea
+_SENTENCE_END = re.compile(r"[.!?…:;]+[\"')\]»]*\s+|\n+")
+_SOFT_BREAK = re.compile(r"[,;]\s+|\s+")
+_MD_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_URL = re.compile(r"https?://\S+")
+_MD_MARKS = re.compile(r"[*_`#>|~]+")
+_SPACES = re.compile(r"\s+")
+
+
+def clean_for_speech(text: str) -> str:
+    """Quita el markdown y las URLs que Piper leería literalmente."""
+    text = _MD_LINK.sub(r"\1", text)
+    text = _URL.sub(" ", text)
+    text = _MD_MARKS.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+class SentenceSplitter:
+    """Trocea el texto que llega a deltas en frases completas para el TTS."""
+
+    def __init__(self, min_chars: int = TTS_MIN_SENTENCE_CHARS, max_chars: int = TTS_MAX_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> list:
+        """Añade un delta y devuelve las frases que ya están cerradas."""
+        self._buffer += delta
+        sentences = []
+        start = 0
+        for m in _SENTENCE_END.finditer(self._buffer):
+            if len(self._buffer[start:m.end()].strip()) >= self.min_chars:
+                sentences.append(self._buffer[start:m.end()])
+                start = m.end()
+        rest = self._buffer[start:]
+        while len(rest) > self.max_chars:
+            cut = None
+            for m in _SOFT_BREAK.finditer(rest, 0, self.max_chars):
+                cut = m.end()
+            cut = cut or self.max_chars
+            sentences.append(rest[:cut])
+            rest = rest[cut:]
+        self._buffer = rest
+        return [s for s in (clean_for_speech(s) for s in sentences) if s]
+
+    def flush(self) -> list:
+        """Lo que quede pendiente al terminar el stream."""
+        rest, self._buffer = clean_for_speech(self._buffer), ""
+        return [rest] if rest else []
+
+
+def speak_stream(raw_generator, synthesize_wav):
+    """Reenvía el stream del LLM y, a la vez, un frame de audio por cada frase.
+
+    Un hilo sintetiza las frases según se cierran mientras el LLM sigue
+    generando; los frames de audio (`{"audio": <wav base64>, "seq", "text"}`)
+    se intercalan con los de texto y el `done` se envía tras el último audio.
+    `synthesize_wav(text)` devuelve el WAV de la frase en memoria.
+    """
+    sentences = queue.Queue()
+    frames = queue.Queue()
+    cancelled = threading.Event()
+    splitter = SentenceSplitter()
+
+    def synth_worker():
+        seq = 0
+        while True:
+            text = sentences.get()
+            if text is None or cancelled.is_set():
+                break
+            try:
+                wav = synthesize_wav(text)
+            except Exception as e:
+                frames.put(sse_frame({"audio_error": str(e), "text": text}))
+                continue
+            if wav:
+                audio = base64.b64encode(wav).decode("ascii")
+                frames.put(sse_frame({"audio": audio, "seq": seq, "text": text}))
+                seq += 1
+        frames.put(None)
+
+    def on_content(delta):
+        for sentence in splitter.feed(delta):
+            sentences.put(sentence)
+
+    def ready_frames(block=False):
+        while True:
+            try:
+                frame = frames.get(block=block)
+            except queue.Empty:
+                return
+            if frame is None:
+                return
+            yield frame
+
+    relay = SSERelay(on_content=on_content)
+    threading.Thread(target=synth_worker, name="ie-tts-stream", daemon=True).start()
+    try:
+        for frame in raw_generator(relay):
+            # El done del LLM se retiene hasta que haya salido todo el audio
+            if frame != DONE_FRAME:
+                yield frame
+            yield from ready_frames()
+        for sentence in splitter.flush():
+            sentences.put(sentence)
+        sentences.put(None)
+        yield from ready_frames(block=True)
+        if relay.completed:
+            yield DONE_FRAME
+    finally:
+        # Cliente desconectado: se deja de sintetizar tras la frase en curso
+        cancelled.set()
+        sentences.put(None)
@@ -0,0 +1,182 @@
+import os
+import time
+import atexit
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+
+from flask import has_app_context
+
+from models import db, ChatMessage
+
+# sync: commit propio por turno, al volver ya está en disco
+# group: se agrupa con otros turnos y se espera al commit compartido (por defecto)
+# async: se encola y se vuelve; ante un crash se pierde como mucho un intervalo de turnos
+TURN_DURABILITY = os.getenv("TURN_DURABILITY", "group")
+TURN_FLUSH_INTERVAL_MS = int(os.getenv("TURN_FLUSH_INTERVAL_MS", "50"))
+TURN_FLUSH_MAX_TURNS = int(os.getenv("TURN_FLUSH_MAX_TURNS", "32"))
+
+DURABILITY_MODES = ("sync", "group", "async")
+
+
+class _Turn:
+    __slots__ = ("user_id", "session_id", "messages", "on_commit", "ids", "error", "done")
+
+    def __init__(self, user_id, session_id, messages, on_commit):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.messages = messages
+        self.on_commit = on_commit
+        self.ids = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class TurnWriter:
+    """Persiste los mensajes de cada turno de chat en una sola transacción.
+
+    En modo group/async un hilo por proceso agrupa los turnos pendientes de
+    todos los usuarios y los escribe con un único commit cada
+    `interval_ms` o al llegar a `max_turns`: menos fsyncs y menos tiempo
+    con el lock de escritura de SQLite. `on_commit(ids)` se llama tras el
+    commit (en el hilo escritor salvo en modo sync).
+    """
+
+    def __init__(self, app, durability: str = TURN_DURABILITY, interval_ms: int = TURN_FLUSH_INTERVAL_MS,
+                 max_turns: int = TURN_FLUSH_MAX_TURNS):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"TURN_DURABILITY debe ser uno de {DURABILITY_MODES}: {durability}")
+        self.app = app
+        self.durability = durability
+        self.interval = interval_ms / 1000
+        self.max_turns = max_turns
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._started_pid = None
+        self._lock = threading.Lock()
+        self._counts = {"turns": 0, "commits": 0, "errors": 0, "max_batch": 0, "commit_ms": 0.0}
+        atexit.register(self.flush)
+
+    def submit(self, user_id, session_id, messages, on_commit=None):
+        """Guarda `messages` [(role, content[, timestamp])] del turno. Devuelve sus ids (None en modo async)."""
+        now = datetime.utcnow()
+        turn = _Turn(user_id, session_id, [(m[0], m[1], m[2] if len(m) > 2 and m[2] else now) for m in messages],
+                     on_commit)
+        if self.durability == "sync":
+            self._write([turn])
+        else:
+            self._ensure_started()
+            with self._cond:
+                self._pending.append(turn)
+                # El hilo escritor abre la ventana de agrupación al primer turno
+                self._cond.notify()
+            if self.durability == "async":
+                return None
+            turn.done.wait()
+        if turn.error:
+            raise turn.error
+        return turn.ids
+
+    def flush(self):
+        """Escribe ya los turnos pendientes (p. ej. al apagar el proceso)."""
+        with self._cond:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._lock:
+            if self._started_pid == pid:
+                return
+            # Tras el fork de gunicorn: lo heredado pertenece al proceso padre
+            self._pending = []
+            self._cond = threading.Condition()
+            threading.Thread(target=self._loop, name="ie-turn-writer", daemon=True).start()
+            self._started_pid = pid
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Ventana de agrupación: deja que lleguen más turnos durante `interval`
+                deadline = time.monotonic() + self.interval
+                while len(self._pending) < self.max_turns:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        # En modo sync se reutiliza la sesión de la petición en curso
+        with nullcontext() if has_app_context() else self.app.app_context():
+            try:
+                self._insert(batch)
+                db.session.commit()
+                commits = 1
+            except Exception as e:
+                db.session.rollback()
+                if len(batch) == 1:
+                    batch[0].error = e
+                    commits = 0
+                    print(f"❌ Error guardando turno de la sesión {batch[0].session_id}: {e}")
+                else:
+                    # Un turno defectuoso no debe tumbar al resto del grupo
+                    commits = 0
+                    for turn in batch:
+                        try:
+                            self._insert([turn])
+                            db.session.commit()
+                            commits += 1
+                        except Exception as te:
+                            db.session.rollback()
+                            turn.error = te
+                            print(f"❌ Error guardando turno de la sesión {turn.session_id}: {te}")
+
+        with self._lock:
+            c = self._counts
+            c["turns"] += len(batch)
+            c["commits"] += commits
+            c["errors"] += sum(1 for t in batch if t.error)
+            c["max_batch"] = max(c["max_batch"], len(batch))
+            c["commit_ms"] += (time.perf_counter() - started) * 1000
+
+        for turn in batch:
+            if turn.error is None and turn.on_commit:
+                try:
+                    turn.on_commit(turn.ids)
+                except Exception as e:
+                    print(f"⚠️ Error tras guardar turno: {e}")
+            turn.done.set()
+
+    def _insert(self, batch):
+        for turn in batch:
+            msgs = [
+                ChatMessage(user_id=turn.user_id, session_id=turn.session_id, role=role, content=content, timestamp=ts)
+                for role, content, ts in turn.messages
+            ]
+            db.session.add_all(msgs)
+            db.session.flush()
+            turn.ids = [m.id for m in msgs]
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self._counts)
+        with self._cond:
+            pending = len(self._pending)
+        commits = c["commits"] or 1
+        c.update({
+            "durability": self.durability,
+            "pending": pending,
+            "turns_per_commit": round(c["turns"] / commits, 2),
+            "avg_commit_ms": round(c.pop("commit_ms") / commits, 2),
+        })
+        return c
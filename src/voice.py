@@ -1,44 +1,62 @@
-import whisper
-from piper import PiperVoice
+import os
+from importlib.util import find_spec
 from pathlib import Path
 import tempfile
-import wave
 import numpy as np
 
-PROJECT_ROOT = Path(__file__).parent.parent
-WHISPER_MODEL = whisper.load_model("base")
-VOICE_MODEL = PROJECT_ROOT / "piper" / "es_ES-davefx-medium.onnx"
+from speech_models import speech_models, SPEECH_PRELOAD
+from audio_buffers import decode_audio, pack_wav_header, WAV_HEADER_BYTES
 
-voice = None
+# Estimación inicial del buffer de síntesis (segundos de audio por carácter de texto)
+TTS_SECONDS_PER_CHAR = float(os.getenv("TTS_SECONDS_PER_CHAR", "0.08"))
+
+# Los modelos se cargan en el primer uso (speech_models.py); aquí solo se
+# comprueba que las dependencias existen para que los importadores puedan caer
+# a su implementación de respaldo.
+for _dep in ("whisper", "piper"):
+    if find_spec(_dep) is None:
+        raise ImportError(f"Falta el paquete de voz '{_dep}'")
+
+if SPEECH_PRELOAD:
+    speech_models.preload(SPEECH_PRELOAD)
 
 def get_voice():
-    global voice
-    if voice is None:
-        voice = PiperVoice.load(str(VOICE_MODEL))
-    return voice
+    return speech_models.piper()
 
-def transcribe_audio(audio_path: str) -> str:
-    result = WHISPER_MODEL.transcribe(audio_path, language="es")
+def transcribe_audio(audio) -> str:
+    """`audio`: ruta, bytes del fichero subido o array float32 a 16 kHz."""
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        audio = decode_audio(audio)
+    result = speech_models.whisper().transcribe(audio, language="es")
     return result["text"].strip()
 
-def synthesize_speech(text: str) -> Path:
-    output_file = Path(tempfile.mkstemp(suffix=".wav")[1])
+def synthesize_wav(text: str) -> bytearray:
+    """WAV (PCM int16 mono) del texto, escrito en un único buffer preasignado.
+
+    Cada chunk de Piper se convierte a int16 directamente sobre el buffer, sin
+    lista de chunks ni concatenación; la cabecera se rellena al final.
+    """
     v = get_voice()
-    
-    # Recolectar todos los chunks
-    audio_chunks = []
+    sample_rate = v.config.sample_rate
+    capacity = max(sample_rate, int(len(text) * TTS_SECONDS_PER_CHAR * sample_rate))
+    buf = bytearray(WAV_HEADER_BYTES + 2 * capacity)
+    n = 0
     for audio_chunk in v.synthesize(text):
-        # Convertir float array a int16
-        audio_int16 = (audio_chunk.audio_float_array * 32767).astype(np.int16)
-        audio_chunks.append(audio_int16)
-    
-    # Concatenar y escribir
-    full_audio = np.concatenate(audio_chunks)
-    
-    with wave.open(str(output_file), "wb") as wav_file:
-        wav_file.setnchannels(1)
-        wav_file.setsampwidth(2)
-        wav_file.setframerate(v.config.sample_rate)
-        wav_file.writeframes(full_audio.tobytes())
-    
+        samples = audio_chunk.audio_float_array
+        if n + len(samples) > capacity:
+            # Estimación corta: se duplica (amortizado)
+            capacity = max(2 * capacity, n + len(samples))
+            buf.extend(bytes(WAV_HEADER_BYTES + 2 * capacity - len(buf)))
+        out = np.frombuffer(buf, dtype=np.int16, count=len(samples), offset=WAV_HEADER_BYTES + 2 * n)
+        np.multiply(samples, 32767, out=out, casting="unsafe")
+        del out  # libera la vista para poder redimensionar buf
+        n += len(samples)
+    pack_wav_header(buf, sample_rate, 2 * n)
+    del buf[WAV_HEADER_BYTES + 2 * n:]
+    return buf
+
+def synthesize_speech(text: str) -> Path:
+    """WAV en un fichero temporal (para los scripts que necesitan una ruta)."""
+    output_file = Path(tempfile.mkstemp(suffix=".wav")[1])
+    output_file.write_bytes(synthesize_wav(text))
     return output_file
@@ -1,28 +1,21 @@
-import whisper
-from piper import PiperVoice
-from pathlib import Path
-import tempfile
-import wave
 import io
+import wave
 
-PROJECT_ROOT = Path(__file__).parent.parent
-WHISPER_MODEL = whisper.load_model("base")
-VOICE_MODEL = PROJECT_ROOT / "piper" / "es_ES-davefx-medium.onnx"
-
-voice = None
+from speech_models import speech_models
+from audio_buffers import decode_audio
 
 def get_voice():
-    global voice
-    if voice is None:
-        voice = PiperVoice.load(str(VOICE_MODEL))
-    return voice
+    return speech_models.piper()
 
-def transcribe_audio(audio_path: str) -> str:
-    result = WHISPER_MODEL.transcribe(audio_path, language="es")
+def transcribe_audio(audio) -> str:
+    """`audio`: ruta, bytes del fichero subido o array float32 a 16 kHz."""
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        audio = decode_audio(audio)
+    result = speech_models.whisper().transcribe(audio, language="es")
     return result["text"].strip()
 
-def synthesize_speech(text: str) -> Path:
-    output_file = Path(tempfile.mkstemp(suffix=".wav")[1])
+def synthesize_wav(text: str) -> bytes:
+    """WAV del texto en memoria (sin pasar por disco)."""
     v = get_voice()
     audio_bytes = io.BytesIO()
     with wave.open(audio_bytes, "wb") as wav_file:
@@ -30,6 +23,4 @@ def synthesize_speech(text: str) -> Path:
         wav_file.setsampwidth(2)
         wav_file.setframerate(v.config.sample_rate)
         v.synthesize(text, wav_file)
-    with open(output_file, "wb") as f:
-        f.write(audio_bytes.getvalue())
-    return output_file
+    return audio_bytes.getvalue()
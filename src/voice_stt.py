@@ -1,11 +1,12 @@
-import whisper
 from pathlib import Path
 
+from speech_models import speech_models
+
 PROJECT_ROOT = Path(__file__).parent.parent
 
 def transcribe(audio_file, language="es"):
-    """Transcribe audio a texto usando Whisper"""
-    model = whisper.load_model("base")
+    """Transcribe audio a texto usando Whisper (modelo compartido, cargado una vez)"""
+    model = speech_models.whisper()
     result = model.transcribe(str(audio_file), language=language)
     return result["text"].strip()
 
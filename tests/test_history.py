@@ -0,0 +1,72 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from models import db, User, ChatSession, ChatMessage, SessionSummary  # noqa: E402
+from history import HistoryBuilder, SUMMARY_MAX_INPUT_CHARS  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'history.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        user = User(username="ana", password_hash="x")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(ChatSession(id=1, user_id=user.id, title="t"))
+        db.session.commit()
+    return app
+
+
+def add_messages(contents):
+    start = datetime.utcnow() - timedelta(hours=1)
+    for i, content in enumerate(contents):
+        db.session.add(ChatMessage(user_id=1, session_id=1, role="user" if i % 2 == 0 else "assistant",
+                                   content=content, timestamp=start + timedelta(seconds=i)))
+    db.session.commit()
+
+
+def checkpoint(builder):
+    """Lo que hace summarize_session, sin la llamada al LLM."""
+    previous, rows = builder.pending_for_summary(1)
+    messages, upto_id = builder.summary_messages(previous.summary if previous else None, rows)
+    db.session.add(SessionSummary(session_id=1, upto_message_id=upto_id, summary="resumen", token_count=1))
+    db.session.commit()
+    return rows, messages[1]["content"], upto_id
+
+
+def test_checkpoint_over_the_cap_only_absorbs_included_rows(app):
+    builder = HistoryBuilder(keep_recent=2)
+    # Cada mensaje ocupa ~1/3 del tope: caben dos por pasada
+    contents = [f"m{i} " + "x" * (SUMMARY_MAX_INPUT_CHARS // 3) for i in range(8)]
+    with app.app_context():
+        add_messages(contents)
+        rows, prompt, upto_id = checkpoint(builder)
+
+        included = [r for r in rows if f"m{rows.index(r)} " in prompt]
+        assert len(included) < len(rows)
+        assert rows[0].content[:10] in prompt  # se rellena desde el más antiguo
+        assert upto_id == included[-1].id
+        assert rows[len(included)].content[:10] not in prompt
+
+        # El siguiente checkpoint empieza justo después de lo absorbido
+        _, pending = builder.pending_for_summary(1)
+        assert pending[0].id == upto_id + 1
+
+
+def test_oversized_first_message_still_advances(app):
+    builder = HistoryBuilder(keep_recent=0)
+    with app.app_context():
+        add_messages(["y" * (SUMMARY_MAX_INPUT_CHARS * 2), "corto"])
+        rows, prompt, upto_id = checkpoint(builder)
+
+        assert upto_id == rows[0].id
+        assert len(prompt) < SUMMARY_MAX_INPUT_CHARS * 2
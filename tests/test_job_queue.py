@@ -0,0 +1,45 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import job_queue  # noqa: E402
+from job_queue import JobQueue  # noqa: E402
+
+
+def make_queue(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", workers=1)
+    queue.register("noop", max_attempts=2)(lambda payload: None)
+    return queue
+
+
+def test_enqueue_does_not_start_workers(tmp_path):
+    queue = make_queue(tmp_path)
+    assert queue.enqueue("noop", {}) is not None
+    assert queue._started_pid is None
+    assert queue.ensure_started() is True
+    assert queue.ensure_started() is False
+
+
+def test_orphaned_job_counts_as_attempt_and_fails_at_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", 0)
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue("noop", {})
+    conn = queue._conn()
+
+    def status():
+        return conn.execute("SELECT status, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    # Primer intento: el worker muere con el job en 'running'
+    assert queue.claim()
+    time.sleep(0.01)
+    queue._recover_and_cleanup(conn)
+    assert tuple(status()) == ("pending", 1)
+
+    # Segundo intento (max_attempts=2): ya no vuelve a la cola
+    assert queue.claim()
+    time.sleep(0.01)
+    queue._recover_and_cleanup(conn)
+    assert tuple(status()) == ("failed", 2)
+    assert queue.claim() == []
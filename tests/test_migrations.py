@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, inspect
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from models import db  # noqa: E402
+import migrations  # noqa: E402
+from migrations import migrate, check_schema, current_version, SCHEMA_HEAD  # noqa: E402
+
+
+def test_fresh_database_matches_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    migrate(engine)
+    assert check_schema(engine) == SCHEMA_HEAD
+
+    insp = inspect(engine)
+    for table in db.metadata.sorted_tables:
+        assert insp.has_table(table.name), table.name
+        columns = {c["name"] for c in insp.get_columns(table.name)}
+        assert {c.name for c in table.columns} <= columns, table.name
+        indexes = {i["name"] for i in insp.get_indexes(table.name)}
+        assert {i.name for i in table.indexes} <= indexes, table.name
+
+
+def test_baseline_creates_only_original_tables(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:1])
+    engine = create_engine(f"sqlite:///{tmp_path / 'v1.db'}")
+    migrate(engine)
+    assert current_version(engine) == 1
+
+    insp = inspect(engine)
+    assert not insp.has_table("cache_generation")
+    assert not insp.has_table("telemetry_minute")
+    assert not insp.has_table("user_memory_fts")
+    assert "excerpt" not in {c["name"] for c in insp.get_columns("news_item")}
+    assert "prompt_version" not in {c["name"] for c in insp.get_columns("user")}
+
+
+def test_migrate_is_idempotent(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'again.db'}")
+    assert len(migrate(engine)) == SCHEMA_HEAD
+    assert migrate(engine) == []
@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import tts_cache  # noqa: E402
+from tts_cache import TTSCache  # noqa: E402
+
+
+def fake_wav(text):
+    return b"RIFF" + text.encode()
+
+
+def test_cached_phrase_is_on_disk_and_skips_synthesis(tmp_path):
+    cache = TTSCache(tmp_path, voice="v.onnx", sample_rate=22050)
+    calls = []
+
+    def synthesize(text):
+        calls.append(text)
+        return fake_wav(text)
+
+    key, wav = cache.get_or_synthesize("Hola  mundo", synthesize)
+    assert key and (tmp_path / f"{key}.wav").read_bytes() == wav
+    assert cache.get_or_synthesize("Hola mundo", synthesize) == (key, wav)
+    assert calls == ["Hola  mundo"]
+
+
+def test_no_key_when_disk_write_fails(tmp_path, monkeypatch):
+    cache = TTSCache(tmp_path, voice="v.onnx", sample_rate=22050)
+
+    def broken_replace(src, dst):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(tts_cache.os, "replace", broken_replace)
+    key, wav = cache.get_or_synthesize("Hola", fake_wav)
+    assert key is None and wav == fake_wav("Hola")
+    assert not list(tmp_path.iterdir())
+
+    # Acierto en memoria sin fichero en disco: tampoco se anuncia la URL
+    key, _ = cache.get_or_synthesize("Hola", fake_wav)
+    assert key is None
+
+    monkeypatch.undo()
+    key, _ = cache.get_or_synthesize("Hola", fake_wav)
+    assert key and (tmp_path / f"{key}.wav").exists()
@@ -0,0 +1,86 @@
+import sys
+import time
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from models import db, User, ChatSession, ChatMessage  # noqa: E402
+from turn_store import TurnWriter  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'turns.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        user = User(username="ana", password_hash="x")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(ChatSession(id=1, user_id=user.id, title="t"))
+        db.session.commit()
+    return app
+
+
+def _submit_in_thread(writer, *args, **kwargs):
+    result = {}
+
+    def run():
+        result["ids"] = writer.submit(*args, **kwargs)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, result
+
+
+def test_group_single_turn_commits_within_interval(app):
+    writer = TurnWriter(app, durability="group", interval_ms=50, max_turns=32)
+    started = time.monotonic()
+    thread, result = _submit_in_thread(writer, 1, 1, [("user", "hola"), ("assistant", "buenas")])
+    thread.join(timeout=2)
+
+    assert not thread.is_alive(), "submit() no volvió: el turno no se escribió"
+    assert time.monotonic() - started < 1
+    assert len(result["ids"]) == 2
+    with app.app_context():
+        assert ChatMessage.query.count() == 2
+
+
+def test_group_batches_concurrent_turns(app):
+    writer = TurnWriter(app, durability="group", interval_ms=100, max_turns=32)
+    threads = [_submit_in_thread(writer, 1, 1, [("user", f"m{i}")])[0] for i in range(3)]
+    for thread in threads:
+        thread.join(timeout=2)
+
+    assert not any(t.is_alive() for t in threads)
+    stats = writer.stats()
+    assert stats["turns"] == 3
+    assert stats["commits"] < 3
+    with app.app_context():
+        assert ChatMessage.query.count() == 3
+
+
+def test_async_turn_is_written_by_the_loop(app):
+    writer = TurnWriter(app, durability="async", interval_ms=20)
+    assert writer.submit(1, 1, [("user", "hola")]) is None
+
+    deadline = time.monotonic() + 2
+    while writer.stats()["turns"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with app.app_context():
+        assert ChatMessage.query.count() == 1
+
+
+def test_user_message_keeps_turn_start_timestamp(app):
+    writer = TurnWriter(app, durability="sync")
+    started_at = datetime.utcnow() - timedelta(seconds=30)
+    with app.app_context():
+        user_id, assistant_id = writer.submit(1, 1, [("user", "hola", started_at), ("assistant", "buenas")])
+        assert db.session.get(ChatMessage, user_id).timestamp == started_at
+        assert db.session.get(ChatMessage, assistant_id).timestamp > started_at